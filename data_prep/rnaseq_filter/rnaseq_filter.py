@@ -13,8 +13,13 @@
 import sys      # for command line arguments
 import os       # for manipulating files and folders
 import argparse # for command line arguments
+import tempfile # for memory-mapped transpose buffer
 import numpy as np # for manipulating matricies
 
+# local modules
+sys.path.insert(0, '../../helper/')
+import rna_cache as rc # for loading RNA seq data from binary cache
+
 
 # # # # # # # # # # # # #
 #   C O N S T A N T S   #
@@ -24,6 +29,7 @@ KAT_FILE_BARCODE_COL = 0 # column with TCGA barcode
 KAT_FILE_Q_VAL_COL   = 1 # column that contains q values of CG enrichment
 NUM_IDS_IN_BARCODE   = 3 # number of '-' separated strings to keep in TCGA barcode. keep first 3
 RNA_FILE_BARCODE_COL = 0 # column with TCGA barcode in RNA sequence file
+NUM_RNA_HEADER_ROWS  = 2 # rows before RNA values in RNA sequence file. TCGA barcodes then 'normalized_count'
 
 
 # # # # # # # # # # # # #
@@ -34,10 +40,15 @@ def main(argv):
 	args = get_args(argv)
 	
 	kats = get_kats(args['kataegis_file'])
-	rnaSeq = get_rnaSeq(args['rna_seq_file'])
 
-	rnaSeq = rnaSeq_with_kat_data(rnaSeq, kats)
-	np.savetxt(sys.stdout, rnaSeq, fmt = '%s', delimiter = '\t', newline = '\n')
+	if args['block_size']:
+		stream_rnaSeq(args['rna_seq_file'], kats, sys.stdout, args['block_size'])
+		return
+
+	header, barcodes, text = get_rnaSeq(args['rna_seq_file'])
+
+	rows = rnaSeq_with_kat_data(barcodes, kats)
+	rc.write_rna_seq(sys.stdout, header, barcodes, text, rows)
 
 #  input: f (file) kataegis file containing TCGA barcodes and q value enrichment for each sample
 #                    along with other values which will be ignored
@@ -46,31 +57,76 @@ def get_kats(f):
 	return np.genfromtxt(f, dtype = str, delimiter = '\t')
 
 #  input: f (file) RNA sequence data. rows are RNAs. cols are TCGA samples
-# output: rnaSeq (np.array) rows are TCGA samples. cols are RNAs. vals are normalized expression counts
-#           first row and first col are meta information: RNA IDs and TCGA barcodes respectively
+# output: header (np.array) [num_rnas+1] (string) RNA IDs. first element is TCGA barcode column header
+#         barcodes (np.array) [num_samples] (string) cleaned TCGA barcodes
+#         text (np.array) [num_samples, num_rnas] (string) memory-mapped view of values as written in f. rows are
+#           TCGA samples. cols are RNAs
 def get_rnaSeq(f):
-	rnaSeq = np.genfromtxt(f, dtype = str, delimiter = '\t')
-	rnaSeq = np.transpose(rnaSeq)    # flip so rows are TCGA samples and cols are different RNAs
-	rnaSeq = np.delete(rnaSeq, 1, 1) # remove first column (filled with 'normalized_count')
-	rnaSeq[:, RNA_FILE_BARCODE_COL] = clean_barcodes(rnaSeq[:, RNA_FILE_BARCODE_COL])
-	return rnaSeq
+	header, barcodes, _ = rc.load_rna_seq(f, genes_by_samples = True)
+	text = rc.load_rna_text(f, genes_by_samples = True) # rows are TCGA samples. cols are RNAs
+	barcodes = clean_barcodes(barcodes)
+	return header, barcodes, text
 
-#  input: rnas (np.array) [num_rna_samples, num_rnas]
+#  input: f (file) RNA sequence data. rows are RNAs. cols are TCGA samples
+#         kats (np.array) [num_kat_samples, 2] cols are [TCGA_barcode, q_val]
+#         out (file) where transposed RNA sequence data of samples with kataegis data is written
+#         block_size (int) number of RNA rows of f to hold in memory at a time
+#   does: same output as get_rnaSeq and rnaSeq_with_kat_data but peak memory is bounded by block_size.
+#           blocks of RNAs are written as columns of a memory-mapped [num_mutual_samples, num_rnas] text buffer
+#           which is then written out one sample row at a time. values are copied as text
+def stream_rnaSeq(f, kats, out, block_size):
+	f.seek(0)
+	header = rc.split_line(f.readline())
+	barcodes = clean_barcodes(np.array(header[1:], dtype = str))
+	rows = rnaSeq_with_kat_data(barcodes, kats) # samples (cols of f) to keep
+	for _ in xrange(1, NUM_RNA_HEADER_ROWS):
+		f.readline()
+	start = f.tell()
+	num_rnas, width = 0, 1
+	for line in f:
+		if line.strip():
+			num_rnas += 1
+			width = max(width, max(map(len, rc.split_line(line)[1:]) or [0]))
+
+	genes = []
+	buf_file = tempfile.TemporaryFile()
+	buf = np.memmap(buf_file, dtype = 'S' + str(width), mode = 'w+', shape = (len(rows), num_rnas))
+	f.seek(start)
+	j, block = 0, []
+	for line in f:
+		if not line.strip():
+			continue
+		cols = rc.split_line(line)
+		genes.append(cols[0])
+		block.append(cols[1:])
+		if len(block) == block_size:
+			j = write_block(buf, j, block, rows)
+			block = []
+	if block:
+		write_block(buf, j, block, rows)
+	buf.flush()
+
+	header = np.array([header[0]] + genes, dtype = str)
+	rc.write_rna_seq(out, header, barcodes[rows], buf)
+	del buf
+	buf_file.close()
+
+#  input: buf (np.memmap) [num_mutual_samples, num_rnas] (string) transposed output buffer
+#         j (int) first column of buf to write block to
+#         block (list of list of string) [num_block_rnas, num_rna_samples] RNA values read from file
+#         rows (np.array) [num_mutual_samples] (int) samples in block to keep
+# output: j (int) first column of buf after block
+def write_block(buf, j, block, rows):
+	block = np.array(block, dtype = buf.dtype)[:, rows]
+	buf[:, j:j+len(block)] = block.T
+	return j + len(block)
+
+#  input: barcodes (np.array) [num_rna_samples] (string) TCGA barcode of each RNA sequence sample
 #         kats (np.array) [num_kat_samples, 2] cols are [TCGA_barcode, q_val]
-# output: rnas_out (np.array) [num_mutual_samples, num_rnas]
-def rnaSeq_with_kat_data(rnas, kats):
-	rna_header = rnas[0]                 # remove RNA sequence header row. will be replaced later
-	rnas = np.delete(rnas, 0, axis = 0)
-	kat_barcodes = get_barcode_set(kats) # find all TCGA barcodes found in both data files
-	rna_barcodes = get_barcode_set(rnas)
-	mut_barcodes = np.intersect1d(kat_barcodes, rna_barcodes)      # mutual barcodes in common
-	to_keep = np.in1d(rnas[:, RNA_FILE_BARCODE_COL], mut_barcodes) # mask. find RNA indixes with mut_barcodes
-	return np.insert(rnas[to_keep], 0, rna_header, axis = 0)       # keep those RNAs. replace header
-
-#  input: arr (np.array) first column must be TCGA barcodes
-# output: barcodes (set)
-def get_barcode_set(arr):
-	return map(np.unique, arr[:, 0].flatten())
+# output: rows (np.array) [num_mutual_samples] (int) indices of samples with barcode in kataegis data
+def rnaSeq_with_kat_data(barcodes, kats):
+	to_keep = np.in1d(barcodes, kats[:, KAT_FILE_BARCODE_COL]) # mask. find RNA indixes with mutual barcodes
+	return np.where(to_keep)[0]
 
 
 #
@@ -109,8 +165,19 @@ def get_args(argv):
 	parser = argparse.ArgumentParser(prog = 'rnaseq_filter.py', description = "transposes RNA sequence data so output rows are samples (with a TCGA barcode) and cols are RNAs. removes any sample not seen in kataegis data")
 	parser.add_argument('-r', '--rna_seq_file', type = lambda x: is_valid_file(parser, x), required = True, help = 'file containing all RNA sequence data. should contain all values for each RNA for each sample in TCGA BRCA')
 	parser.add_argument('-k', '--kataegis_file', type = lambda x: is_valid_file(parser, x), required = True, help = 'file containing q-value enrichment for each sample')
+	parser.add_argument('-b', '--block_size', type = lambda x: positive_int(parser, x), help = 'stream RNA sequence file holding at most this many RNA rows in memory at a time instead of loading it from binary cache. use for files that do not fit in memory')
 	return vars(parser.parse_args(argv))
 
+def positive_int(parser, arg):
+	err_msg = 'should be integer greater than 0'
+	try:
+		arg = int(arg)
+	except:
+		parser.error(err_msg)
+	if arg <= 0:
+		parser.error(err_msg)
+	return arg
+
 def is_valid_file(parser, arg):
 	if not os.path.exists(arg):
 		parser.error('The file \"' + str(arg) + '\" could not be found.')
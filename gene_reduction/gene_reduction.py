@@ -13,12 +13,16 @@
 import sys      # for command line arguments
 import os       # for manipulating files and folders
 import argparse # for command line arguments
+import multiprocessing   # for running permutations in parallel
 import numpy as np       # for manipulating matricies
 import scipy.stats as st # for calculating Z value of normal(0, 1) distribution
 
 # local modules
 sys.path.insert(0, '../helper/')
 import kataegis_splitter as ks # for splitting RNA seq data to kataegis pos and neg samples
+import rna_cache as rc         # for loading RNA seq data from binary cache
+import gene_stats as gs        # for one pass per gene mean and variance
+import gene_registry as gr     # for matching whitelist genes by integer gene id
 
 
 # # # # # # # # # # # # #
@@ -28,6 +32,7 @@ import kataegis_splitter as ks # for splitting RNA seq data to kataegis pos and
 GENE_WHITELIST = ['APOBEC1|339', 'APOBEC2|10930', 'APOBEC3A|200315', 'APOBEC3B|9582',
                   'APOBEC3C|27350', 'APOBEC3D|140564', 'APOBEC3F|200316', 'APOBEC3G|60489',
                   'APOBEC3H|164668', 'APOBEC4|403314']
+PERM_BATCH_SIZE = 100 # number of label permutations multiplied against expression matrix at once
 
 
 # # # # # # # # # # # # #
@@ -38,61 +43,187 @@ def main(argv):
 	args = get_args(argv)
 
 	kats = np.genfromtxt(args['kataegis_file'], dtype = str, delimiter = '\t')
-	rnas = np.genfromtxt(args['rna_seq_file'], dtype = str, delimiter = '\t')
 
-	# keep all samples with TCGA barcodes in both
-	kats, rnas = ks.keep_same_barcode(kats, rnas)
+	cls = args['confidence_level']
 
-	rnas_pos, rnas_neg = ks.kat_split(rnas, kats, args['q_value_cutoff'])
-	
-	rnas_out = remove_genes(rnas_pos, rnas_neg, rnas[0], args['confidence_level'], GENE_WHITELIST)
+	has_kat, barcodes, cohort_rows = None, None, None
+	if args['stream']:
+		has_kat = ks.get_has_kat_dic(kats, args['q_value_cutoff']) # key: barcode, val: True/False for kat pos/neg
+		header, group_stats = gs.stream_group_stats(args['rna_seq_file'], has_kat, (True, False))
+		stats_pos, stats_neg = group_stats[True], group_stats[False]
+	else:
+		header, barcodes, expr = rc.load_rna_seq(args['rna_seq_file'])
+		pos_rows, neg_rows = ks.split_rows(barcodes, kats, args['q_value_cutoff']) # rows of samples with TCGA barcodes in both
+		stats_pos = gs.matrix_stats(expr, pos_rows)
+		stats_neg = gs.matrix_stats(expr, neg_rows)
+		cohort_rows = np.concatenate([pos_rows, neg_rows])
 
-	np.savetxt(sys.stdout, rnas_out, fmt = '%s', delimiter = '\t', newline = '\n')
+	# Welch statistic is found once for all confidence levels
+	gene_avgs_diff, gene_stds_diff = get_welch_stats(stats_pos, stats_neg)
 
-#  input: rnas_pos (np.array) [num_samples_kataegis_positive, num_genes]
-#         rnas_neg (np.array) [num_samples_kataegis_negative, num_genes]
-#         rnas_header (np.array) [num_genes+1] header information for output RNA sequence data
-#         cl (float) (1-alpha) percent confidence level. used to remove non-differentially expressed genes
-#         whitelist (list of string) genes that should never be removed
-# output: rnas (np.array) [num_samples+1, num_confident_genes+1] with header information
-def remove_genes(rnas_pos, rnas_neg, rnas_header, cl, whitelist):
-	Z = st.norm.ppf(cl + (1.0-cl)/2.0) # Z-score for standard normal
-	col_head_pos = rnas_pos[:, 0] # save column header of TCGA barcodes
-	col_head_neg = rnas_neg[:, 0]
-	rnas_pos = np.delete(rnas_pos, 0, axis = 1) # remove column header
-	rnas_neg = np.delete(rnas_neg, 0, axis = 1)
-	gene_avgs_pos = np.mean(rnas_pos.astype(float), axis = 0) # average expression for kataegis pos genes
-	gene_avgs_neg = np.mean(rnas_neg.astype(float), axis = 0) #                                 neg
-	gene_vars_pos = np.var(rnas_pos.astype(float), axis = 0)  # variance expression for kataegis pos genes
-	gene_vars_neg = np.var(rnas_neg.astype(float), axis = 0)  #                                  neg
+	if args['sweep_file']:
+		sweep_cls = np.union1d(cls, args['sweep_levels'] or [])
+		keeps = get_keep_masks(gene_avgs_diff, gene_stds_diff, header, sweep_cls, GENE_WHITELIST)
+		with open(args['sweep_file'], 'w') as f:
+			write_sweep(f, header, sweep_cls, keeps)
+
+	if args['permutations']:
+		fname = rc.get_fname(args['rna_seq_file'])
+		obs_diffs, p_vals = permutation_test(fname, pos_rows, neg_rows, args['permutations'], args['num_processes'], args['seed'])
+		with open(args['permutation_file'], 'w') as f:
+			write_permutation_test(f, header, obs_diffs, p_vals, bh_fdr(p_vals))
+
+	keeps = get_keep_masks(gene_avgs_diff, gene_stds_diff, header, cls, GENE_WHITELIST)
+	for cl, keep in zip(cls, keeps):
+		keep_genes = np.where(keep)[0]
+		if not args['output_prefix']:
+			write_reduced(sys.stdout, args, header, keep_genes, has_kat, barcodes, cohort_rows)
+			continue
+		with open(args['output_prefix'] + '.cl_' + str(cl) + '.txt', 'w') as out:
+			write_reduced(out, args, header, keep_genes, has_kat, barcodes, cohort_rows)
+
+#  input: out (file) where reduced RNA sequence data is written
+#         args (dict) command line arguments
+#         header (np.array) [num_genes+1] header information for RNA sequence data
+#         keep_genes (np.array) [num_confident_genes] column indices of genes to keep
+#         has_kat (dict) key is TCGA barcode. val is True/False for kataegis pos/neg. only used with --stream
+#         barcodes (np.array) [num_samples] (string) TCGA barcode of each row of cache. not used with --stream
+#         cohort_rows (np.array) (int) rows of kataegis positive then negative samples. not used with --stream
+def write_reduced(out, args, header, keep_genes, has_kat, barcodes, cohort_rows):
+	if args['stream']:
+		stream_reduced(args['rna_seq_file'], has_kat, keep_genes, out)
+	else:
+		rc.write_rna_seq(out, header, barcodes, rc.load_rna_text(args['rna_seq_file']), cohort_rows, keep_genes)
+
+#  input: stats_pos (dict) per gene expression accumulator from gene_stats of kataegis positive samples
+#         stats_neg (dict) per gene expression accumulator from gene_stats of kataegis negative samples
+# output: gene_avgs_diff (np.array) [num_genes] difference in mean expression between kataegis pos and neg
+#         gene_stds_diff (np.array) [num_genes] standard error of gene_avgs_diff
+def get_welch_stats(stats_pos, stats_neg):
+	gene_avgs_pos = stats_pos['mean'] # average expression for kataegis pos genes
+	gene_avgs_neg = stats_neg['mean'] #                                 neg
+	gene_vars_pos = gs.get_var(stats_pos) # variance expression for kataegis pos genes
+	gene_vars_neg = gs.get_var(stats_neg) #                                  neg
 
 	gene_avgs_diff = gene_avgs_pos - gene_avgs_neg
-	gene_stds_diff = np.sqrt(gene_vars_pos / float(len(rnas_pos)) + gene_vars_neg / float(len(rnas_neg)))
-	gene_los = gene_avgs_diff - Z * gene_stds_diff
-	gene_his = gene_avgs_diff + Z * gene_stds_diff
+	gene_stds_diff = np.sqrt(gene_vars_pos / float(stats_pos['n']) + gene_vars_neg / float(stats_neg['n']))
+	return gene_avgs_diff, gene_stds_diff
+
+#  input: gene_avgs_diff (np.array) [num_genes] see get_welch_stats
+#         gene_stds_diff (np.array) [num_genes] see get_welch_stats
+#         rnas_header (np.array) [num_genes+1] header information for RNA sequence data
+#         cls (list of float) [num_levels] (1-alpha) percent confidence levels
+#         whitelist (list of string) genes that should never be removed
+# output: keeps (np.array) [num_levels, num_genes] (bool) True if gene is kept at confidence level
+def get_keep_masks(gene_avgs_diff, gene_stds_diff, rnas_header, cls, whitelist):
+	cls = np.asarray(cls, dtype = float)
+	Zs = st.norm.ppf(cls + (1.0-cls)/2.0) # Z-score for standard normal. one for each level
+
+	# remove genes where 0 is inside confidence interval unless gene is in whitelist
+	# 0 is inside [diff - Z*std, diff + Z*std] exactly when |diff| <= Z*std
+	should_remove = np.abs(gene_avgs_diff) <= Zs[:, np.newaxis] * gene_stds_diff
+	registry = gr.new_registry(rnas_header[1:])
+	should_remove &= ~gr.get_mask(registry, gr.get_ids(registry, whitelist))
+	return ~should_remove
 
-	should_remove = np.zeros_like(gene_los)
-	for i in xrange(0, len(gene_los)): # for each gene
-		if is_between(0, gene_los[i], gene_his[i]) and not rnas_header[i+1] in whitelist:
-			should_remove[i] = 1
-		else:
-			should_remove[i] = 0
+#  input: fname (string) RNA sequence data file. loaded from binary cache so all processes share one copy
+#         pos_rows (np.array) [num_samples_kataegis_positive] (int) rows of kataegis positive samples
+#         neg_rows (np.array) [num_samples_kataegis_negative] (int) rows of kataegis negative samples
+#         num_perms (int) number of times kataegis pos/neg labels are shuffled
+#         num_procs (int) number of processes to spread permutations across
+#         seed (int) seed for random label shuffles
+# output: obs_diffs (np.array) [num_genes] difference in mean expression between kataegis pos and neg
+#         p_vals (np.array) [num_genes] two sided empirical p-value of each difference
+def permutation_test(fname, pos_rows, neg_rows, num_perms, num_procs, seed):
+	_, _, expr = rc.load_rna_seq(fname)
+	weights = get_diff_weights(expr.shape[0], pos_rows, neg_rows)
+	obs_diffs = weights.dot(expr)
 
-	# remove columns that are not differentially expressed
-	rnas_pos = np.delete(rnas_pos, np.where(should_remove), axis = 1)
-	rnas_neg = np.delete(rnas_neg, np.where(should_remove), axis = 1)
-	should_remove = np.insert(should_remove, 0, False) # do not remove TCGA barcode header
-	rnas_header = np.delete(rnas_header, np.where(should_remove))
+	jobs = []
+	cohort_rows = np.concatenate([pos_rows, neg_rows])
+	for i, start in enumerate(xrange(0, num_perms, PERM_BATCH_SIZE)):
+		jobs.append((fname, cohort_rows, len(pos_rows), min(PERM_BATCH_SIZE, num_perms - start), seed + i, obs_diffs))
+	if num_procs > 1:
+		pool = multiprocessing.Pool(num_procs)
+		counts = pool.imap_unordered(count_extreme_perms, jobs)
+	else:
+		counts = (count_extreme_perms(job) for job in jobs)
+	num_extreme = np.zeros(len(obs_diffs), dtype = int)
+	for count in counts:
+		num_extreme += count
+	if num_procs > 1:
+		pool.close()
+		pool.join()
+	return obs_diffs, (num_extreme + 1.0) / (num_perms + 1.0)
+
+#  input: job (tuple) fname, cohort_rows, num_pos, num_perms, seed, obs_diffs. see permutation_test
+# output: num_extreme (np.array) [num_genes] (int) number of permutations with absolute mean difference at
+#           least that of obs_diffs. all permutations of the batch are one matrix multiply
+def count_extreme_perms(job):
+	fname, cohort_rows, num_pos, num_perms, seed, obs_diffs = job
+	_, _, expr = rc.load_rna_seq(fname) # memory-mapped. pages are shared between processes
+	rand = np.random.RandomState(seed)
+	weights = np.zeros([num_perms, expr.shape[0]])
+	for k in xrange(0, num_perms):
+		perm = rand.permutation(cohort_rows)
+		weights[k] = get_diff_weights(expr.shape[0], perm[:num_pos], perm[num_pos:])
+	perm_diffs = weights.dot(expr) # [num_perms, num_genes]
+	return np.sum(np.abs(perm_diffs) >= np.abs(obs_diffs), axis = 0)
+
+# returns weights (np.array) [num_samples] so that weights.dot(expr) is mean of pos_rows minus mean of neg_rows
+def get_diff_weights(num_samples, pos_rows, neg_rows):
+	weights = np.zeros(num_samples)
+	weights[pos_rows] = 1.0 / len(pos_rows)
+	weights[neg_rows] = -1.0 / len(neg_rows)
+	return weights
 
-	# insert headers back
-	rnas_pos = np.insert(rnas_pos, 0, col_head_pos, axis = 1)
-	rnas_neg = np.insert(rnas_neg, 0, col_head_neg, axis = 1)
+#  input: p_vals (np.array) [num_genes] (float)
+# output: q_vals (np.array) [num_genes] (float) Benjamini-Hochberg false discovery rate adjusted p-values
+def bh_fdr(p_vals):
+	m = len(p_vals)
+	order = np.argsort(p_vals)
+	q_sorted = p_vals[order] * m / np.arange(1.0, m + 1.0)
+	q_sorted = np.minimum.accumulate(q_sorted[::-1])[::-1] # enforce monotone from largest p-value down
+	q_vals = np.empty(m)
+	q_vals[order] = np.minimum(q_sorted, 1.0)
+	return q_vals
 
-	# merge kataegis positive, negative, and header for RNA sequence data
-	return np.insert(np.insert(rnas_neg, 0, rnas_pos, 0), 0, rnas_header, 0)
+#  input: f (file) where permutation test results are written
+#         rnas_header (np.array) [num_genes+1] header information for RNA sequence data
+#         obs_diffs, p_vals, q_vals (np.array) [num_genes] from permutation_test and bh_fdr
+def write_permutation_test(f, rnas_header, obs_diffs, p_vals, q_vals):
+	f.write('gene\tmean_diff\tp_value\tfdr\n')
+	for gene, diff, p_val, q_val in zip(rnas_header[1:], obs_diffs, p_vals, q_vals):
+		f.write(gene + '\t' + repr(float(diff)) + '\t' + repr(float(p_val)) + '\t' + repr(float(q_val)) + '\n')
 
-def is_between(x, low, high):
-	return low <= x and x <= high
+#  input: f (file) where sweep report is written
+#         rnas_header (np.array) [num_genes+1] header information for RNA sequence data
+#         cls (np.array) [num_levels] (float) confidence levels
+#         keeps (np.array) [num_levels, num_genes] (bool) from get_keep_masks
+#   does: writes one tab separated line for each level: level, number of genes kept, comma separated genes kept
+def write_sweep(f, rnas_header, cls, keeps):
+	genes = rnas_header[1:]
+	f.write('confidence_level\tnum_genes\tgenes\n')
+	for cl, keep in zip(cls, keeps):
+		f.write(repr(float(cl)) + '\t' + str(np.count_nonzero(keep)) + '\t' + ','.join(genes[keep]) + '\n')
+
+#  input: f (file) RNA sequence data. first row is header with gene names. first col is TCGA barcodes
+#         has_kat (dict) key is TCGA barcode. val is True/False for kataegis pos/neg
+#         keep_genes (np.array) [num_confident_genes] column indices of genes to keep
+#         out (file) where reduced RNA sequence data is written
+#   does: writes kataegis positive then negative samples, one line at a time, reading f once for each
+def stream_reduced(f, has_kat, keep_genes, out):
+	keep_cols = np.insert(keep_genes + 1, 0, 0).tolist() # keep TCGA barcode column
+	for group in [None, True, False]: # None writes header
+		f.seek(0)
+		header = f.readline()
+		if group is None:
+			out.write('\t'.join(rc.split_line(header)[i] for i in keep_cols) + '\n')
+			continue
+		for line in f:
+			cols = rc.split_line(line)
+			if has_kat.get(cols[0]) is group:
+				out.write('\t'.join([ cols[i] for i in keep_cols ]) + '\n')
 
 
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
@@ -103,9 +234,26 @@ def get_args(argv):
 	parser = argparse.ArgumentParser(prog = 'barcode_and_q_values.py', description = "creates a tab separated value sheet with TCGA barcodes and q-value enrichment")
 	parser.add_argument('-r', '--rna_seq_file', type = lambda x: is_valid_file(parser, x), required = True, help = 'file containing all RNA sequence data. should contain all values for each RNA for each sample in TCGA BRCA')
 	parser.add_argument('-k', '--kataegis_file', type = lambda x: is_valid_file(parser, x), required = True, help = 'file containing q-value enrichment for each sample')
-	parser.add_argument('-c', '--confidence_level', type = lambda x: bounded_float(parser, x, 0.0, 1.0), required = True, help = 'float between 0.0 and 1.0. probability a gene is differentially expressed between kataegis positve and negative samples. Increasing this will remove more genes.')
+	parser.add_argument('-c', '--confidence_level', type = lambda x: bounded_float(parser, x, 0.0, 1.0), nargs = '+', required = True, help = 'one or more floats between 0.0 and 1.0. probability a gene is differentially expressed between kataegis positve and negative samples. Increasing this will remove more genes. reduced RNA sequence data is written for each')
 	parser.add_argument('-q', '--q_value_cutoff', type = lambda x: bounded_float(parser, x, 0.0, 1.0), default = 0.05, help = 'float between 0.0 and 1.0. any samples with q value <= cutoff are kataegis positive. q value > cutoff are kataegis negative')
-	return vars(parser.parse_args(argv))
+	parser.add_argument('-s', '--stream', action = 'store_true', help = 'read RNA sequence file line by line instead of loading it from binary cache. memory use is proportional to number of genes')
+	parser.add_argument('-o', '--output_prefix', help = 'write reduced RNA sequence data for each confidence level to <prefix>.cl_<level>.txt instead of standard out. required for more than one confidence level')
+	parser.add_argument('-w', '--sweep_file', help = 'file to write number of genes kept and which genes are kept for each confidence level in -c and -l')
+	parser.add_argument('-l', '--sweep_levels', type = lambda x: bounded_float(parser, x, 0.0, 1.0), nargs = '+', help = 'extra confidence levels to report in sweep file. no reduced RNA sequence data is written for these')
+	parser.add_argument('-p', '--permutations', type = lambda x: positive_int(parser, x), help = 'number of kataegis pos/neg label shuffles for a permutation test of each gene. writes empirical p-values and Benjamini-Hochberg FDR to permutation file')
+	parser.add_argument('-P', '--permutation_file', help = 'file to write permutation test results to. required with -p')
+	parser.add_argument('-j', '--num_processes', type = lambda x: positive_int(parser, x), default = 1, help = 'number of processes to spread permutations across')
+	parser.add_argument('--seed', type = int, default = 0, help = 'seed for permutation test label shuffles')
+	args = vars(parser.parse_args(argv))
+	if len(args['confidence_level']) > 1 and not args['output_prefix']:
+		parser.error('-o/--output_prefix is required for more than one confidence level')
+	if args['sweep_levels'] and not args['sweep_file']:
+		parser.error('-w/--sweep_file is required with -l/--sweep_levels')
+	if args['permutations'] and not args['permutation_file']:
+		parser.error('-P/--permutation_file is required with -p/--permutations')
+	if args['permutations'] and args['stream']:
+		parser.error('-p/--permutations needs the binary cache and can not be used with -s/--stream')
+	return args
 
 def bounded_float(parser, arg, low, high):
 	err_msg = 'confidence level must be float between 0.0 and 1.0'
@@ -117,6 +265,16 @@ def bounded_float(parser, arg, low, high):
 		parser.error(err_msg)
 	return arg
 
+def positive_int(parser, arg):
+	err_msg = 'should be integer greater than 0'
+	try:
+		arg = int(arg)
+	except:
+		parser.error(err_msg)
+	if arg <= 0:
+		parser.error(err_msg)
+	return arg
+
 def is_valid_file(parser, arg):
 	if not os.path.exists(arg):
 		parser.error('The file \"' + str(arg) + '\" could not be found.')
@@ -13,10 +13,15 @@ import sys      # for command line arguments
 import os       # for manipulating files and folders
 import argparse # for command line arguments
 import numpy as np    # for manipulating matricies
-import networkx as nx # for creating a graph
-from operator import itemgetter # TEMPORARY for getting which hub in the graph to display
+import networkx as nx # for drawing ego graphs
 import matplotlib.pyplot as plt # for plotting and saving plots
 
+# local modules
+sys.path.insert(0, '../helper/')
+import pairs_format as pf # for loading .pairs files from binary form
+import csr_graph as cg    # for building gene graphs from edge arrays
+import gene_registry as gr # for looking up gene ids of GENE_NAMES
+
 
 # # # # # # # # # # # # #
 #   C O N S T A N T S   #
@@ -35,94 +40,106 @@ THRESHES = np.linspace(0.5, 0.9, 20)
 
 def main(argv):
 	args = get_args(argv)
-	pairs = np.genfromtxt(args['input_file'], dtype = str, delimiter = '\t')
-	
+	pairs = pf.load_pairs(args['input_file'])
+
 	# create graph
 	graph = get_graph(pairs, args['edge_threshold'])
 
 	# for gene_name in GENE_NAMES:
-	# 	write_ego_graph(graph, gene_name)
+	# 	write_ego_graph(graph, gene_name, get_plot_fname(args['output_directory'], 'ego_', gene_name))
 
 	if args['kat_neg']:
 		kat_pos_pairs = pairs
-		kat_neg_pairs = np.genfromtxt(args['kat_neg'], dtype = str, delimiter = '\t')
+		kat_neg_pairs = pf.load_pairs(args['kat_neg'])
 		kat_pos_gene_neighbor_dic = get_gene_neighbor_dic(kat_pos_pairs, THRESHES)
 		kat_neg_gene_neighbor_dic = get_gene_neighbor_dic(kat_neg_pairs, THRESHES)
 		for gene_name, pos_vals in kat_pos_gene_neighbor_dic.iteritems():
 			neg_vals = kat_neg_gene_neighbor_dic[gene_name]
-			write_plot_neighbors_vs_edge_weights(pos_vals, neg_vals, THRESHES, gene_name)
+			fname = get_plot_fname(args['output_directory'], 'neighbors_', gene_name)
+			write_plot_neighbors_vs_edge_weights(pos_vals, neg_vals, THRESHES, gene_name, fname)
 
 	# exit()
 
 	# PLOT TOP HUBS
-	node_and_degree = graph.degree()
-	nodes = sorted(node_and_degree.items(), key = itemgetter(1))[::-1]
-	counter = 0
-	for gene_name, degree in nodes:
-		edges = graph.edges(gene_name, data = True)
-		weights = [ round(data['weight'], 3) for _, _, data in edges ]
-		num_pos, num_neg = count_pos_neg(weights)
-		counter += 1
+	degrees = cg.degree(graph)
+	for counter, node in enumerate(cg.top_hubs(graph, TOP_HUBS_TO_DISPLAY), 1):
+		_, weights = cg.neighbors(graph, node)
+		num_pos, num_neg = count_pos_neg(np.round(weights, 3))
 		s = str(counter) + '.\t'
-		s += gene_name + '\t' + str(degree) + '\t+' + str(num_pos) + '/-' + str(num_neg)
+		s += graph['names'][node] + '\t' + str(degrees[node]) + '\t+' + str(num_pos) + '/-' + str(num_neg)
 		print s
-		if counter >= TOP_HUBS_TO_DISPLAY:
-			break
 
-def write_plot_neighbors_vs_edge_weights(num_pos_neighbors, num_neg_neighbors, edge_weight_thresholds, gene_name):
+def write_plot_neighbors_vs_edge_weights(num_pos_neighbors, num_neg_neighbors, edge_weight_thresholds, gene_name, fname):
 	line_pos, = plt.plot(edge_weight_thresholds, num_pos_neighbors, 'r', label = 'kataegis positive')
 	line_neg, = plt.plot(edge_weight_thresholds, num_neg_neighbors, 'b', label = 'kataegis negative')
 	plt.xlabel('edge weight threshold')
 	plt.ylabel('number of neighbors')
 	plt.title('number of neighbors with varying weight for gene ' + gene_name)
 	plt.legend(handles = [line_pos, line_neg])
-	plt.savefig('neighbors_' + gene_name.replace('|', '_') + '.png')
+	plt.savefig(fname)
 	plt.clf()
 
+#  input: pairs (tuple) (genes, src, dst, weights) from pf.load_pairs
+#         threshes (np.array) [num_threshes] (float) edge weight thresholds
+# output: gene_neighbor_dic (dict) key is gene name in GENE_NAMES. val (list of int) [num_threshes] number of
+#           neighbors gene has in get_graph(pairs, thresh) for each thresh
+#   does: reads edges once. each neighbor's strongest edge to gene is sorted so any number of thresholds is a
+#           binary search instead of building a graph for each
 def get_gene_neighbor_dic(pairs, threshes):
+	genes, src, dst, weights = pairs
+	registry = gr.new_registry(genes)
+	gene_ids = gr.get_ids(registry, GENE_NAMES)
+	is_wanted = gr.get_mask(registry, gene_ids)
+	edges = np.flatnonzero((is_wanted[src] | is_wanted[dst]) & (src != dst)) # edges touching any wanted gene
+	src, dst, weights = src[edges], dst[edges], np.abs(weights[edges])
+
 	gene_neighbor_dic = {}
-	for gene_name in GENE_NAMES:
-		gene_neighbor_dic[gene_name] = []
-	for thresh in threshes:
-		graph = get_graph(pairs, thresh)
-		for gene_name in GENE_NAMES:
-			gene_neighbor_dic[gene_name].append(len(graph.edges(gene_name)))
+	for gene_name, gene_id in zip(GENE_NAMES, gene_ids.tolist()):
+		strengths = np.zeros(0)
+		if gene_id >= 0:
+			strengths = get_neighbor_strengths(gene_id, src, dst, weights, len(genes))
+		counts = len(strengths) - np.searchsorted(strengths, threshes, side = 'left') # neighbors >= thresh
+		gene_neighbor_dic[gene_name] = counts.tolist()
 	return gene_neighbor_dic
 
-# input: vals (list of float)
+#  input: gene_id (int) gene to find neighbors of
+#         src, dst (np.array) [num_edges] (int) gene ids of each edge
+#         abs_weights (np.array) [num_edges] (float) absolute weight of each edge
+#         num_genes (int)
+# output: strengths (np.array) [num_neighbors] (float) sorted largest absolute weight of any edge (in either
+#           direction) between gene and each neighbor
+def get_neighbor_strengths(gene_id, src, dst, abs_weights, num_genes):
+	is_src, is_dst = src == gene_id, dst == gene_id
+	neighbors = np.concatenate([dst[is_src], src[is_dst]])
+	strength = np.full(num_genes, -1.0)
+	np.maximum.at(strength, neighbors, np.concatenate([abs_weights[is_src], abs_weights[is_dst]]))
+	return np.sort(strength[strength >= 0])
+
+# input: vals (np.array) (float)
 def count_pos_neg(vals):
-	num_pos, num_neg = 0, 0
-	for val in vals:
-		if val < 0:
-			num_neg += 1
-		else:
-			num_pos += 1
-	return num_pos, num_neg
-
-# writes the ego graph of gene with gene_name to a file
-def write_ego_graph(graph, gene_name):
-	hub_ego = nx.ego_graph(graph, gene_name)
+	num_neg = int(np.count_nonzero(vals < 0))
+	return len(vals) - num_neg, num_neg
+
+# writes the ego graph of gene with gene_name to file fname (.png)
+def write_ego_graph(graph, gene_name, fname):
+	node = gr.get_ids(gr.new_registry(graph['names']), [gene_name])[0]
+	hub_ego = cg.to_networkx(cg.ego_graph(graph, node))
 	pos = nx.spring_layout(hub_ego)
 	nx.draw(hub_ego, pos, node_color='b', node_size=50, with_labels = True)
 	nx.draw_networkx_nodes(hub_ego, pos, nodelist = [gene_name], node_size = 300, node_color='r')
-	plt.savefig('ego_' + gene_name.replace('|', '_') + '.png')
+	plt.savefig(fname)
 	plt.clf()
 
-# input: pairs (np.array) [num_pairs, 3] (string)
+# returns file name of plot of gene with gene_name in out_dir. ex: out_dir/ego_APOBEC3B_9582.png
+def get_plot_fname(out_dir, prefix, gene_name):
+	return out_dir + prefix + gene_name.replace('|', '_') + '.png'
+
+# input: pairs (tuple) (genes, src, dst, weights) from pf.load_pairs
 #        edge_thresh (float) values where if absolute value of edge weight is below we do not include edge
+# output: graph (dict) from cg.build_graph. nodes are every gene in pairs
 def get_graph(pairs, edge_thresh):
-	G = nx.Graph()
-	genes = np.unique(pairs[:, 0])
-	G.add_nodes_from(genes)
-	for geneA, geneB, edge_val in pairs:
-		try:
-			edge_val = float(edge_val)
-		except:
-			continue
-		if geneA == geneB or abs(edge_val) < edge_thresh:
-			continue
-		G.add_edge(geneA, geneB, {'weight': edge_val})
-	return G
+	genes, src, dst, weights = pairs
+	return cg.build_graph(genes, src, dst, weights, edge_thresh)
 
 
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
@@ -131,9 +148,10 @@ def get_graph(pairs, edge_thresh):
 
 def get_args(argv):
 	parser = argparse.ArgumentParser(prog = 'barcode_and_q_values.py', description = "creates a tab separated value sheet with TCGA barcodes and q-value enrichment")
-	parser.add_argument('input_file', help = 'input .pairs gene network file file', type = lambda x: is_valid_file(parser, x))
+	parser.add_argument('input_file', help = 'input .pairs gene network file file or its binary directory from pairs_format.py', type = lambda x: is_valid_file(parser, x))
 	parser.add_argument('-t', '--edge_threshold', type = lambda x: float_between(parser, x, 0.0, 1.0), required = True, help = 'cutoff where we will not display any edges with absolute weight lower than threshold. must be between 0.0 and 1.0 non inclusive')
-	parser.add_argument('-n', '--kat_neg', type = lambda x: is_valid_file(parser, x), help = '.pairs for kataegis negative. input file should then be kataegis positive')
+	parser.add_argument('-n', '--kat_neg', type = lambda x: is_valid_file(parser, x), help = '.pairs (or its binary directory) for kataegis negative. input file should then be kataegis positive')
+	parser.add_argument('-o', '--output_directory', type = lambda x: valid_directory(parser, x), default = '.', help = 'directory for plots to go. defaults to current directory')
 	return vars(parser.parse_args(argv))
 
 def float_between(parser, arg, low, high):
@@ -146,11 +164,22 @@ def float_between(parser, arg, low, high):
 		parser.error(err_msg)
 	return arg
 
+# returns string as directory. adds error to parser if no valid directory
+def valid_directory(parser, arg):
+	if not os.path.exists(arg):
+		parser.error('The directory \"' + str(arg) + '\" could not be found.')
+	return directorize(arg)
+
+# add "/" to end of directory name if necessary
+def directorize(dir_name):
+	if dir_name.endswith('/'):
+		return dir_name
+	return dir_name + '/'
+
 def is_valid_file(parser, arg):
 	if not os.path.exists(arg):
 		parser.error('The file \"' + str(arg) + '\" could not be found.')
-	else:
-		return open(arg, 'r')
+	return arg # name so binary pairs directories are also accepted
 
 
 # # # # # # # # # # # # # # # # # # # # # # # # #
@@ -0,0 +1,164 @@
+#     file: corr_shards.py
+#   author: Jesse Eaton and Jacob West-Roberts
+#  created: October 17, 2026
+# modified: October 17, 2026
+#  purpose: Split tiled coexpression network inference into shards that can run on separate machines. each
+#             shard is a self-describing directory of binary arrays. shards are merged into the same output a
+#             single process makes
+
+
+# # # # # # # # # # #
+#   I M P O R T S   #
+# # # # # # # # # # #
+
+import os     # for manipulating files and folders
+import json   # for reading and writing shard meta information
+import shutil # for removing half written shards
+import numpy as np # for manipulating matricies
+import panda_engine as pe # for tiled coexpression
+
+
+# # # # # # # # # # # # #
+#   C O N S T A N T S   #
+# # # # # # # # # # # # #
+
+SHARD_VERSION = 1
+SHARD_FMT     = '.shard_%d_of_%d' # appended to output file name to get shard directory
+META_FNAME    = 'meta.json'       # shard number, number of shards, block size, dtype and threshold
+GENE_FNAME    = 'genes.npy'       # [num_genes] names of genes
+TILE_FNAME    = 'tiles.npy'       # [num_tiles, 2] (int) (row_start, col_start) of each tile. without threshold
+VALUE_FNAME   = 'values.bin'      # (float) tiles flattened one after another. or force of each edge with threshold
+ROW_FNAME     = 'rows.bin'        # [num_edges] (int32) first gene of each edge. with threshold
+COL_FNAME     = 'cols.bin'        # [num_edges] (int32) second gene of each edge. with threshold
+INDEX_DTYPE   = np.int32
+WRITE_EDGES   = 100000            # edges written to text output at a time when merging
+
+
+# # # # # # # # # # # # #
+#   F U N C T I O N S   #
+# # # # # # # # # # # # #
+
+#  input: dirname (string) directory to write shard to
+#         genes (list of string) [num_genes] names of rows of expr
+#         expr (np.array) [num_genes, num_samples] (float) may be memory-mapped
+#         shard (int) which shard to compute. 0 <= shard < num_shards
+#         num_shards (int) total number of shards
+#         threshold (float) only keep edges with absolute correlation at least this. keeps every tile if None
+#         dtype, mem_budget see pe.tiled_correlation. should be the same for every shard
+#   does: computes every num_shards'th tile of the coexpression network and streams it to dirname. only one
+#           tile is in memory at a time
+def write_shard(dirname, genes, expr, shard, num_shards, threshold = None, dtype = np.float64, mem_budget = pe.MEM_BUDGET):
+	dirname = dirname.rstrip('/') + '/'
+	temp_dir = dirname.rstrip('/') + '.tmp/'
+	if os.path.exists(temp_dir):
+		shutil.rmtree(temp_dir)
+	os.makedirs(temp_dir)
+	np.save(temp_dir + GENE_FNAME, np.array(genes, dtype = str))
+
+	tiles, num_values = [], 0
+	with open(temp_dir + VALUE_FNAME, 'wb') as value_f, open(temp_dir + ROW_FNAME, 'wb') as row_f, \
+	     open(temp_dir + COL_FNAME, 'wb') as col_f:
+		for i, j, tile in pe.tiled_correlation(expr, dtype, mem_budget, shard, num_shards):
+			if threshold is None:
+				tiles.append((i, j))
+				tile.tofile(value_f)
+				num_values += tile.size
+			else:
+				rows, cols, forces = pe.get_tile_edges(i, j, tile, threshold)
+				rows.astype(INDEX_DTYPE).tofile(row_f)
+				cols.astype(INDEX_DTYPE).tofile(col_f)
+				forces.tofile(value_f)
+				num_values += len(forces)
+	np.save(temp_dir + TILE_FNAME, np.array(tiles, dtype = int).reshape(-1, 2))
+
+	block = pe.get_block_size(len(genes), expr.shape[1], np.dtype(dtype).itemsize, mem_budget)
+	meta = {'version': SHARD_VERSION, 'shard': shard, 'num_shards': num_shards, 'num_genes': len(genes),
+	        'block': block, 'dtype': np.dtype(dtype).name, 'threshold': threshold, 'num_values': num_values}
+	with open(temp_dir + META_FNAME, 'w') as f:
+		json.dump(meta, f)
+	if os.path.exists(dirname):
+		shutil.rmtree(dirname)
+	os.rename(temp_dir, dirname)
+
+#  input: dirnames (list of string) directories written by write_shard. one for every shard
+# output: shards (list of dict) [num_shards] in shard order. 'meta' (dict), 'genes' (np.array), 'tiles' (np.array)
+#           and memory-mapped 'values', 'rows', 'cols' (np.array)
+#   does: raises ValueError if shards are missing or were not made with the same settings
+def read_shards(dirnames):
+	shards = [ read_shard(dirname) for dirname in dirnames ]
+	if not shards:
+		raise ValueError('need exactly one of each shard; none given')
+	shards.sort(key = lambda shard: shard['meta']['shard'])
+	first = shards[0]
+	num_shards = first['meta']['num_shards']
+	if [ shard['meta']['shard'] for shard in shards ] != range(0, num_shards):
+		raise ValueError('need exactly one of each of ' + str(num_shards) + ' shards')
+	for shard in shards:
+		for key in ['num_shards', 'num_genes', 'block', 'dtype', 'threshold']:
+			if shard['meta'][key] != first['meta'][key]:
+				raise ValueError('shards have different ' + key)
+		if not np.array_equal(shard['genes'], first['genes']):
+			raise ValueError('shards have different genes')
+	return shards
+
+#  input: shards (list of dict) from read_shards. made without threshold
+#         fname (string) .npy file to write correlation to
+# output: corr (np.array) [num_genes, num_genes] (float) memory-mapped. same as pe.correlation_memmap
+def merge_dense(shards, fname):
+	meta = shards[0]['meta']
+	num_genes, block = meta['num_genes'], meta['block']
+	corr = np.lib.format.open_memmap(fname, mode = 'w+', dtype = meta['dtype'], shape = (num_genes, num_genes))
+	for shard in shards:
+		offset = 0
+		for i, j in shard['tiles'].tolist():
+			num_rows, num_cols = min(block, num_genes - i), min(block, num_genes - j)
+			tile = shard['values'][offset:offset + num_rows * num_cols].reshape(num_rows, num_cols)
+			offset += num_rows * num_cols
+			corr[i:i+num_rows, j:j+num_cols] = tile
+			if i != j:
+				corr[j:j+num_cols, i:i+num_rows] = tile.T
+	corr.flush()
+	return corr
+
+#  input: f (file) open file to write to
+#         shards (list of dict) from read_shards. made with threshold
+# output: num_edges (int) number of edges written
+#   does: writes edges of every shard in the same order as pe.write_correlation_edges
+def merge_edges(f, shards):
+	genes, block = shards[0]['genes'].tolist(), shards[0]['meta']['block']
+	rows = np.concatenate([ shard['rows'] for shard in shards ]).astype(int)
+	cols = np.concatenate([ shard['cols'] for shard in shards ]).astype(int)
+	forces = np.concatenate([ shard['values'] for shard in shards ])
+	order = np.lexsort((cols, rows, cols // block, rows // block)) # tile order then row major within tile
+	f.write(pe.PAIRS_HEADER + '\n')
+	for k in xrange(0, len(order), WRITE_EDGES):
+		idxs = order[k:k+WRITE_EDGES]
+		pe.write_edges(f, genes, rows[idxs], cols[idxs], forces[idxs])
+	return len(order)
+
+# returns directory name of shard of output file fname
+def get_shard_dirname(fname, shard, num_shards):
+	return fname + SHARD_FMT % (shard, num_shards)
+
+
+#
+#   H E L P E R   F U N C T I O N S
+#
+
+def read_shard(dirname):
+	dirname = dirname.rstrip('/') + '/'
+	with open(dirname + META_FNAME, 'r') as f:
+		meta = json.load(f)
+	if meta['version'] != SHARD_VERSION:
+		raise ValueError('shard ' + dirname + ' has version ' + str(meta['version']) + ' not ' + str(SHARD_VERSION))
+	shard = {'meta': meta, 'genes': np.load(dirname + GENE_FNAME), 'tiles': np.load(dirname + TILE_FNAME)}
+	shard['values'] = load_bin(dirname + VALUE_FNAME, meta['dtype'])
+	shard['rows'] = load_bin(dirname + ROW_FNAME, INDEX_DTYPE)
+	shard['cols'] = load_bin(dirname + COL_FNAME, INDEX_DTYPE)
+	return shard
+
+# memory-maps flat binary file. np.memmap can not map empty files
+def load_bin(fname, dtype):
+	if os.path.getsize(fname) == 0:
+		return np.zeros(0, dtype = dtype)
+	return np.memmap(fname, dtype = dtype, mode = 'r')
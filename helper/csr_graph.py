@@ -0,0 +1,117 @@
+#     file: csr_graph.py
+#   author: Jesse Eaton and Jacob West-Roberts
+#  created: October 17, 2026
+# modified: October 17, 2026
+#  purpose: Undirected weighted gene graph in compressed sparse row form built in bulk from edge arrays. degree,
+#             neighbors, hubs and ego graphs without networkx. networkx is only needed to plot
+
+
+# # # # # # # # # # #
+#   I M P O R T S   #
+# # # # # # # # # # #
+
+import numpy as np # for manipulating matricies
+
+
+# # # # # # # # # # # # #
+#   F U N C T I O N S   #
+# # # # # # # # # # # # #
+
+#  input: names (np.array) [num_nodes] (string) name of each node. node ids index into this
+#         src, dst (np.array) [num_edges] (int) node ids of each edge
+#         weights (np.array) [num_edges] (float) weight of each edge. all 1 if None
+#         thresh (float) edges with absolute weight below this are left out. keeps every edge if None
+# output: graph (dict) 'names' (np.array) [num_nodes] (string)
+#                      'indptr' (np.array) [num_nodes+1] (int) neighbors of node i are indices[indptr[i]:indptr[i+1]]
+#                      'indices' (np.array) [2*num_undirected_edges] (int) neighbor ids. sorted for each node
+#                      'weights' (np.array) [2*num_undirected_edges] (float) weight of edge to each neighbor
+#   does: same graph as adding each edge to an nx.Graph in order. self edges are dropped and when an edge is given
+#           more than once (in either direction) the last weight is kept
+def build_graph(names, src, dst, weights = None, thresh = None):
+	src, dst = np.asarray(src), np.asarray(dst)
+	if weights is None:
+		weights = np.ones(len(src))
+	keep = src != dst
+	if thresh is not None:
+		keep &= np.abs(weights) >= thresh
+	keep = np.flatnonzero(keep)
+	num_nodes = len(names)
+
+	# each undirected edge in both directions. order is position in input so duplicates keep the last
+	rows = np.concatenate([src[keep], dst[keep]]).astype(np.int64)
+	cols = np.concatenate([dst[keep], src[keep]]).astype(np.int64)
+	order = np.concatenate([keep, keep])
+	vals = np.concatenate([weights[keep], weights[keep]])
+	keys = rows * num_nodes + cols
+	idxs = np.lexsort((order, keys))
+	keys, vals = keys[idxs], vals[idxs]
+	is_last = np.append(keys[1:] != keys[:-1], True) if len(keys) else np.zeros(0, dtype = bool)
+	keys, vals = keys[is_last], vals[is_last]
+
+	indptr = np.zeros(num_nodes + 1, dtype = np.int64)
+	indptr[1:] = np.cumsum(np.bincount(keys // num_nodes, minlength = num_nodes)) if len(keys) else 0
+	return {'names': np.asarray(names), 'indptr': indptr, 'indices': keys % num_nodes, 'weights': vals}
+
+# returns degree (np.array) [num_nodes] (int) number of neighbors of each node
+def degree(graph):
+	return np.diff(graph['indptr'])
+
+#  input: graph (dict) from build_graph
+# output: src (np.array) [num_edges] (int) smaller node id of each undirected edge. sorted
+#         dst (np.array) [num_edges] (int) larger node id of each undirected edge
+#         weights (np.array) [num_edges] (float) weight of each edge
+def edges(graph):
+	rows = np.repeat(np.arange(len(graph['names'])), degree(graph))
+	upper = rows < graph['indices'] # each undirected edge once
+	return rows[upper], graph['indices'][upper], graph['weights'][upper]
+
+#  input: graph (dict) from build_graph
+#         node (int) node id
+# output: neighbors (np.array) [degree] (int) node ids of neighbors. sorted
+#         weights (np.array) [degree] (float) weight of edge to each neighbor
+def neighbors(graph, node):
+	start, end = graph['indptr'][node], graph['indptr'][node + 1]
+	return graph['indices'][start:end], graph['weights'][start:end]
+
+#  input: graph (dict) from build_graph
+#         num_hubs (int) number of hubs to find
+# output: hubs (np.array) [num_hubs] (int) node ids with highest degree. highest first
+def top_hubs(graph, num_hubs):
+	degrees = degree(graph)
+	num_hubs = min(num_hubs, len(degrees))
+	if num_hubs == 0:
+		return np.zeros(0, dtype = int)
+	hubs = np.argpartition(-degrees, num_hubs - 1)[:num_hubs]
+	return hubs[np.argsort(-degrees[hubs], kind = 'mergesort')]
+
+#  input: graph (dict) from build_graph
+#         node (int) node id
+# output: ego (dict) graph (see build_graph) of node, its neighbors and every edge between them
+#   does: raises ValueError if node is not in graph (ex: -1 from gr.get_ids for a missing gene)
+def ego_graph(graph, node):
+	if node < 0 or node >= len(graph['names']):
+		raise ValueError('node ' + str(node) + ' is not in graph')
+	nodes = np.union1d(neighbors(graph, node)[0], [node])
+	return subgraph(graph, nodes)
+
+#  input: graph (dict) from build_graph
+#         nodes (np.array) (int) sorted node ids to keep
+# output: sub (dict) graph (see build_graph) of nodes and every edge between them. node ids are positions in nodes
+def subgraph(graph, nodes):
+	nodes = np.asarray(nodes)
+	new_id = np.full(len(graph['names']), -1, dtype = np.int64)
+	new_id[nodes] = np.arange(len(nodes))
+	rows, cols, vals = edges(graph)
+	keep = (new_id[rows] >= 0) & (new_id[cols] >= 0)
+	return build_graph(graph['names'][nodes], new_id[rows[keep]], new_id[cols[keep]], vals[keep])
+
+#  input: graph (dict) from build_graph
+# output: G (nx.Graph) same nodes (by name) and edges with 'weight' attribute. for plotting
+def to_networkx(graph):
+	import networkx as nx # only needed to plot
+	rows, cols, vals = edges(graph)
+	names = graph['names']
+	G = nx.Graph()
+	G.add_nodes_from(names.tolist())
+	G.add_weighted_edges_from(zip(names[rows].tolist(), names[cols].tolist(), vals.tolist()))
+	return G
@@ -0,0 +1,69 @@
+#     file: gene_registry.py
+#   author: Jesse Eaton and Jacob West-Roberts
+#  created: October 17, 2026
+# modified: October 17, 2026
+#  purpose: Maps 'SYMBOL|ENTREZ' gene names and gene symbols to dense int32 IDs once so scripts compare
+#             integers instead of strings
+
+
+# # # # # # # # # # #
+#   I M P O R T S   #
+# # # # # # # # # # #
+
+import numpy as np # for manipulating matricies
+
+
+# # # # # # # # # # # # #
+#   C O N S T A N T S   #
+# # # # # # # # # # # # #
+
+SEP          = '|'          # between symbol and Entrez ID in gene names. ex: 'APOBEC3B|9582'
+ID_DTYPE     = np.int32
+
+
+# # # # # # # # # # # # #
+#   F U N C T I O N S   #
+# # # # # # # # # # # # #
+
+#  input: names (list or np.array) [num_genes] (string) gene names. 'SYMBOL|ENTREZ' or just 'SYMBOL'
+# output: registry (dict) 'names' (np.array) [num_genes] (string) gene id of each name is its index
+#                         'symbol_names' (np.array) [num_symbols] (string) sorted distinct symbols. symbol id is index
+#                         'symbol_of' (np.array) [num_genes] (int32) symbol id of each gene
+#   does: splits every name once (vectorized). sorted orders are kept for lookups
+def new_registry(names):
+	names = np.asarray(names, dtype = str).reshape(-1)
+	symbols = np.char.partition(names, SEP).reshape(-1, 3)[:, 0] # part before separator
+	symbol_names, symbol_of = np.unique(symbols, return_inverse = True)
+	return {'names': names, 'symbol_names': symbol_names, 'symbol_of': symbol_of.astype(ID_DTYPE),
+	        'name_order': np.argsort(names, kind = 'mergesort')}
+
+#  input: registry (dict) from new_registry
+#         queries (list or np.array) [num_queries] (string) gene names. ex: 'APOBEC3B|9582'
+# output: ids (np.array) [num_queries] (int32) gene id of each query. -1 if not in registry
+def get_ids(registry, queries):
+	return lookup(registry['names'], registry['name_order'], queries)
+
+#  input: registry (dict) from new_registry
+#         ids (np.array) (int) gene ids. -1 is ignored
+# output: mask (np.array) [num_genes] (bool) True for each gene in ids
+def get_mask(registry, ids):
+	ids = np.asarray(ids)
+	mask = np.zeros(len(registry['names']), dtype = bool)
+	mask[ids[ids >= 0]] = True
+	return mask
+
+
+#
+#   H E L P E R   F U N C T I O N S
+#
+
+# returns index (int32) into keys of each query by binary search on keys[order]. -1 if not in keys
+def lookup(keys, order, queries):
+	queries = np.asarray(queries, dtype = str).reshape(-1)
+	if len(keys) == 0:
+		return np.full(len(queries), -1, dtype = ID_DTYPE)
+	sorted_keys = keys[order]
+	idxs = np.searchsorted(sorted_keys, queries)
+	idxs[idxs == len(sorted_keys)] = 0 # past the end. can not match
+	found = sorted_keys[idxs] == queries
+	return np.where(found, order[idxs], -1).astype(ID_DTYPE)
@@ -0,0 +1,114 @@
+#     file: gene_stats.py
+#   author: Jesse Eaton and Jacob West-Roberts
+#  created: October 16, 2026
+# modified: October 16, 2026
+#  purpose: One pass per gene count, mean and variance of expression for groups of samples (ex. kataegis
+#             positive and negative). partial results from separate chunks of samples can be merged
+
+
+# # # # # # # # # # #
+#   I M P O R T S   #
+# # # # # # # # # # #
+
+import numpy as np # for manipulating matricies
+
+
+# # # # # # # # # # # # #
+#   C O N S T A N T S   #
+# # # # # # # # # # # # #
+
+STATS_DTYPE = np.float64
+BLOCK_SIZE  = 256 # number of sample rows combined into an accumulator at a time
+
+
+# # # # # # # # # # # # #
+#   F U N C T I O N S   #
+# # # # # # # # # # # # #
+
+#  input: num_genes (int)
+# output: stats (dict) accumulator. 'n' (int) number of samples
+#                                   'mean' (np.array) [num_genes] (float) mean expression of each gene
+#                                   'm2' (np.array) [num_genes] (float) sum of squared differences from mean
+def new_stats(num_genes):
+	return {'n': 0, 'mean': np.zeros(num_genes, dtype = STATS_DTYPE), 'm2': np.zeros(num_genes, dtype = STATS_DTYPE)}
+
+#  input: stats (dict) accumulator from new_stats
+#         block (np.array) [num_block_samples, num_genes] (float) expression of more samples
+#   does: adds block to stats in place. block mean and m2 are found vectorized then merged (Chan et al.)
+def update_stats(stats, block):
+	block = np.asarray(block, dtype = STATS_DTYPE)
+	if len(block) == 0:
+		return
+	block_mean = np.mean(block, axis = 0)
+	block_m2 = np.sum(np.square(block - block_mean), axis = 0)
+	merge_into(stats, len(block), block_mean, block_m2)
+
+#  input: stats_a (dict) accumulator
+#         stats_b (dict) accumulator over a different set of samples
+# output: stats (dict) accumulator over samples of both. neither input is changed
+def merge_stats(stats_a, stats_b):
+	stats = {'n': stats_a['n'], 'mean': stats_a['mean'].copy(), 'm2': stats_a['m2'].copy()}
+	merge_into(stats, stats_b['n'], stats_b['mean'], stats_b['m2'])
+	return stats
+
+# returns mean expression of each gene in accumulator. nan (same as np.mean) if accumulator has no samples
+def get_mean(stats):
+	if stats['n'] == 0:
+		return np.full(len(stats['mean']), np.nan)
+	return stats['mean']
+
+# returns population variance (same as np.var) of each gene in accumulator
+def get_var(stats):
+	return stats['m2'] / float(stats['n'])
+
+#  input: expr (np.array) [num_samples, num_genes] (float) may be memory-mapped
+#         rows (np.array) [num_group_samples] (int) rows of expr in group
+# output: stats (dict) accumulator over rows. only BLOCK_SIZE rows of expr are in memory at a time
+def matrix_stats(expr, rows):
+	stats = new_stats(expr.shape[1])
+	for i in xrange(0, len(rows), BLOCK_SIZE):
+		update_stats(stats, expr[rows[i:i+BLOCK_SIZE]])
+	return stats
+
+#  input: f (file) RNA sequence data. first row is header with gene names. first col is TCGA barcodes
+#         group_of (dict) key is TCGA barcode. val is group the sample belongs to. ex: True/False for kat pos/neg
+#                         samples with barcode not in group_of are skipped
+#         groups (iterable) groups to always have an accumulator for, even if no sample falls in them
+# output: header (np.array) [num_genes+1] (string) header row of f
+#         group_stats (dict) key is group. val is accumulator over samples in group
+#   does: reads f once. memory is proportional to number of genes times number of groups
+def stream_group_stats(f, group_of, groups = ()):
+	f.seek(0)
+	header = np.array(f.readline().rstrip('\r\n').split('\t'), dtype = str)
+	num_genes = len(header) - 1
+	group_stats, blocks = {}, {}
+	for group in set(group_of.values()).union(groups):
+		group_stats[group], blocks[group] = new_stats(num_genes), []
+	for line in f:
+		cols = line.rstrip('\r\n').split('\t')
+		if cols[0] not in group_of:
+			continue
+		group = group_of[cols[0]]
+		blocks[group].append(cols[1:])
+		if len(blocks[group]) == BLOCK_SIZE:
+			update_stats(group_stats[group], np.array(blocks[group], dtype = STATS_DTYPE))
+			blocks[group] = []
+	for group, block in blocks.iteritems():
+		update_stats(group_stats[group], np.array(block, dtype = STATS_DTYPE))
+	return header, group_stats
+
+
+#
+#   H E L P E R   F U N C T I O N S
+#
+
+# adds n samples with mean and m2 to stats in place
+def merge_into(stats, n, mean, m2):
+	if n == 0:
+		return
+	n_a = stats['n']
+	n_ab = n_a + n
+	delta = mean - stats['mean']
+	stats['mean'] += delta * (n / float(n_ab))
+	stats['m2'] += m2 + np.square(delta) * (n_a * n / float(n_ab))
+	stats['n'] = n_ab
@@ -12,87 +12,82 @@
 import numpy as np # for manipulating matricies
 
 
-# # # # # # # # # # # # #
-#   C O N S T A N T S   #
-# # # # # # # # # # # # #
-
-STR_LENGTH   = 20 # set maximum length of a string in a numpy array
-
-
 # # # # # # # # # # # # #
 #   F U N C T I O N S   #
 # # # # # # # # # # # # #
 
-#   input: rnas (np.array) [num_rna_samples+1, num_genes] RNA sequence data with header
-#          kats (np.array) [num_kat_samples, 2] has TCGA barcodes and q-value
-#  output: rnas_out (np.array) [num_same_barcode_samples, num_genes]
-#          rnas_out (np.array) [num_same_barcode_samples, 2]
-# putpose: keeps all elements in each array that have the same barcode
-def keep_same_barcode(kats, rnas):
-	rnas_header = rnas[0]
-	rnas = np.delete(rnas, 0, 0) # remove header
-
-	kats = kats[np.argsort(kats[:, 0])]
-	rnas = rnas[np.argsort(rnas[:, 0])]
-
-	m, n = len(kats), len(rnas)
-	i, j = 0, 0
-	keep_kats, keep_rnas = np.zeros(m, dtype = bool), np.zeros(n, dtype = bool)
-	while True:
-		if i >= m:
-			while j < n:
-				keep_rnas[j] = False
-				j += 1
-			break
-		if j >= n:
-			while i < m:
-				keep_kats[i] = False
-				i += 1
-			break
-		kat_bar, rna_bar = kats[i, 0], rnas[j, 0]
-		if kat_bar == rna_bar:
-			keep_kats[i], keep_rnas[j] = True, True
-			i += 1
-			j += 1
-		elif kat_bar < rna_bar:
-			keep_kats[i] = False
-			i += 1
-		else:
-			keep_rnas[j] = False
-			j += 1
-	kats_out = kats[keep_kats]
-	rnas_out = np.insert(rnas[keep_rnas], 0, rnas_header, axis = 0)
-	return kats_out, rnas_out
-
-#  input: rnas (np.array) [num_samples+1, num_genes] RNA sequence data with header
-#         kats (np.array) [num_samples, 2] has TCGA barcodes and q-value
+#  input: kats (np.array) [num_kat_samples, 2] has TCGA barcodes and q-value
+#         barcodes (np.array) [num_rna_samples] TCGA barcode of each row of a float expression matrix
+# output: kat_rows (np.array) [num_same_barcode_samples] (int) rows of kats with barcode in barcodes
+#         rna_rows (np.array) [num_same_barcode_samples] (int) rows of expression matrix with barcode in kats
+#                                                             kat_rows[i] and rna_rows[i] have same barcode
+# putpose: finds all samples that have the same barcode. sorted by barcode
+def keep_same_barcode(kats, barcodes):
+	return match_barcodes(kats[:, 0], barcodes)
+
+#  input: keys (np.array) [num_keys] (string) barcodes to look up in. first of any duplicates is matched
+#         queries (np.array) [num_queries] (string) barcodes to look up
+# output: key_rows (np.array) [num_matches] (int) index into keys of each match
+#         query_rows (np.array) [num_matches] (int) index into queries of each match. in sorted barcode order
+def match_barcodes(keys, queries):
+	key_order = np.argsort(keys, kind = 'mergesort')
+	query_order = np.argsort(queries, kind = 'mergesort')
+	sorted_keys = keys[key_order]
+	sorted_queries = queries[query_order]
+	if len(sorted_keys) == 0:
+		return np.zeros(0, dtype = int), np.zeros(0, dtype = int)
+	idxs = np.searchsorted(sorted_keys, sorted_queries)
+	idxs[idxs == len(sorted_keys)] = 0 # past the end. can not match
+	found = sorted_keys[idxs] == sorted_queries
+	return key_order[idxs[found]], query_order[found]
+
+#  input: barcodes (np.array) [num_samples] TCGA barcode of each row of a float expression matrix
+#         kats (np.array) [num_kat_samples, 2] has TCGA barcodes and q-value
 #         cutoff (float) q-value enrichment cutoff to separate kataegis pos from neg
-# output: rnas_pos (np.array) [num_samples_kataegis_positive]
-#         rnas_neg (np.array) [num_samples_kataegis_negative]
-def kat_split(rnas, kats, cutoff):
-	rnas = np.delete(rnas, 0, axis = 0) # remove first (header) row
-	num_genes = rnas.shape[1]
-
-	# dictionary. key: barcode, val: True/Fals for Kat pos/neg
-	has_kat = get_has_kat_dic(kats, cutoff)
-	num_pos, num_neg = count_pos_neg(has_kat) # count number of kataegis pos vs neg
+# output: is_pos (np.array) [num_samples] (bool) mask of rows of expression matrix that are kataegis positive
+#         is_neg (np.array) [num_samples] (bool) mask of rows of expression matrix that are kataegis negative
+#                                                rows in neither have no kataegis data
+def kat_split(barcodes, kats, cutoff):
+	kat_rows, rna_rows = keep_same_barcode(kats, barcodes)
+	has_kat = kats[kat_rows, 1].astype(float) <= cutoff
+	is_pos = np.zeros(len(barcodes), dtype = bool)
+	is_neg = np.zeros(len(barcodes), dtype = bool)
+	is_pos[rna_rows[has_kat]] = True
+	is_neg[rna_rows[~has_kat]] = True
+	return is_pos, is_neg
+
+#  input: barcodes (np.array) [num_samples] TCGA barcode of each row of a float expression matrix
+#         kats (np.array) [num_kat_samples, 2] has TCGA barcodes and q-value
+#         cutoff (float) q-value enrichment cutoff to separate kataegis pos from neg
+# output: pos_rows (np.array) (int) rows of expression matrix that are kataegis positive. sorted by barcode
+#         neg_rows (np.array) (int) rows of expression matrix that are kataegis negative. sorted by barcode
+def split_rows(barcodes, kats, cutoff):
+	kat_rows, rna_rows = keep_same_barcode(kats, barcodes)
+	is_pos = kats[kat_rows, 1].astype(float) <= cutoff
+	return rna_rows[is_pos], rna_rows[~is_pos]
+
+#  input: barcodes (np.array) [num_samples] TCGA barcode of each row of a float expression matrix
+#         kats (np.array) [num_kat_samples, 2] has TCGA barcodes and q-value
+#         cutoffs (list of float) sorted q-value enrichment cutoffs
+# output: splits (list of tuple) [num_cutoffs] (pos_rows, neg_rows) for each cutoff. see split_rows
+def multi_split_rows(barcodes, kats, cutoffs):
+	kat_rows, rna_rows = keep_same_barcode(kats, barcodes)
+	ranks = get_cutoff_ranks(kats[kat_rows, 1].astype(float), cutoffs)
+	return [ (rna_rows[ranks <= i], rna_rows[ranks > i]) for i in xrange(0, len(cutoffs)) ]
+
+#  input: q_vals (np.array) [num_samples] (float) q-value of each sample
+#         cutoffs (list of float) sorted q-value enrichment cutoffs
+# output: ranks (np.array) [num_samples] (int) number of cutoffs each sample is kataegis negative for.
+#                                              sample is kataegis positive for cutoffs[rank:]
+def get_cutoff_ranks(q_vals, cutoffs):
+	return np.searchsorted(cutoffs, q_vals, side = 'left')
 
-	# create two separate arrays. one for kat pos. other for kat neg
-	rnas_pos = np.zeros([num_pos, num_genes], dtype = 'S' + str(STR_LENGTH))
-	rnas_neg = np.zeros([num_neg, num_genes], dtype = 'S' + str(STR_LENGTH))
-	i, j = 0, 0
-	for sample in rnas:
-		barcode = sample[0]
-		if barcode in has_kat:
-			if has_kat[barcode]:
-				rnas_pos[i, :] = sample
-				i += 1
-			else:
-				rnas_neg[j, :] = sample
-				j += 1
-	
-	# remove all zero rows (rows that were not used due to not finding a barcode in RNA seq data)
-	return rnas_pos[np.all(rnas_pos != '', axis=1)], rnas_neg[np.all(rnas_neg != '', axis=1)]
+#  input: kats (np.array) [num_samples, 2] has TCGA barcodes and q-value
+#         cutoffs (list of float) sorted q-value enrichment cutoffs
+# output: dic (dict) key is TCGA barcode. val is rank (int) from get_cutoff_ranks
+def get_cutoff_rank_dic(kats, cutoffs):
+	ranks = get_cutoff_ranks(kats[:, 1].astype(float), cutoffs)
+	return dict(zip(kats[:, 0], ranks.tolist()))
 
 #  input: kats (np.array) [num_samples, 2] has TCGA barcodes and q-value
 #         cutoff (float) q-value enrichment cutoff to separate kataegis pos from neg
@@ -107,17 +102,6 @@ def get_has_kat_dic(kats, cutoff):
 			dic[barcode] = False
 	return dic
 
-# returns the number of values that are True and number of values that are False
-def count_pos_neg(dic):
-	num_pos, num_neg = 0, 0
-	for key, is_pos in dic.iteritems():
-		if is_pos:
-			num_pos += 1
-		else:
-			num_neg += 1
-	return num_pos, num_neg
-
-
 # # # # # # # # # # # # # # # # # # # # # # # # #
 #   C A L L   T O   M A I N   F U N C T I O N   #
 # # # # # # # # # # # # # # # # # # # # # # # # #
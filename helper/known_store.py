@@ -0,0 +1,188 @@
+#     file: known_store.py
+#   author: Jesse Eaton and Jacob West-Roberts
+#  created: October 17, 2026
+# modified: October 17, 2026
+#  purpose: One time import of a known regulatory network (tab separated gene, _, gene, _) to an indexed store.
+#             sorted edge table with per gene offsets, memory-mapped on every later load
+
+
+# # # # # # # # # # #
+#   I M P O R T S   #
+# # # # # # # # # # #
+
+import sys      # for command line arguments
+import os       # for manipulating files and folders
+import argparse # for command line arguments
+import json     # for reading and writing store meta information
+import shutil   # for removing stale stores
+from array import array # for compact lists of gene ids while reading
+import numpy as np # for manipulating matricies
+import gene_registry as gr # for looking up gene ids by name
+
+
+# # # # # # # # # # # # #
+#   C O N S T A N T S   #
+# # # # # # # # # # # # #
+
+STORE_EXT     = '.store'       # store directory is placed next to known network file with this extension
+STORE_VERSION = 1              # bump to rebuild every store when the layout below changes
+GENE_FNAME    = 'genes.npy'    # [num_genes] sorted gene names. index of each is its gene id
+INDPTR_FNAME  = 'indptr.npy'   # [num_genes+1] (int64) neighbors of gene i are neighbors[indptr[i]:indptr[i+1]]
+NEIGHBOR_FNAME = 'neighbors.npy' # [2*num_edges] (int32) sorted neighbor gene ids of each gene. self edges once
+META_FNAME    = 'meta.json'    # source file size and modification time
+GENE_COLS     = (0, 2)         # cols of known network file with gene names. other cols are never stored
+ID_DTYPE      = np.int32
+
+
+# # # # # # # # # # # # #
+#   F U N C T I O N S   #
+# # # # # # # # # # # # #
+
+def main(argv):
+	args = get_args(argv)
+	store_dir = build_store(get_fname(args['known_network_file']))
+	print store_dir
+
+#  input: f (file or string) known network file. tab separated with gene names in GENE_COLS
+# output: store (dict) 'genes' (np.array) [num_genes] (string) sorted gene names
+#                      'indptr' (np.array) [num_genes+1] (int64) offsets of each gene's neighbors
+#                      'neighbors' (np.array) [2*num_edges] (int32) memory-mapped. sorted neighbors of each gene
+#                      'registry' (dict) from gr.new_registry of genes
+#   does: builds store first if missing or if f has changed since store was built
+def load_store(f):
+	fname = get_fname(f)
+	store_dir = get_store_dir(fname)
+	if not is_fresh(read_meta(store_dir), fname):
+		build_store(fname)
+	genes = np.load(store_dir + GENE_FNAME)
+	return {'genes': genes, 'indptr': np.load(store_dir + INDPTR_FNAME),
+	        'neighbors': np.load(store_dir + NEIGHBOR_FNAME, mmap_mode = 'r'), 'registry': gr.new_registry(genes)}
+
+#  input: fname (string) known network file
+# output: store_dir (string) directory store was written to
+#   does: reads fname once keeping only gene name cols. edges are undirected. duplicates are dropped
+def build_store(fname):
+	store_dir = get_store_dir(fname)
+	stat = os.stat(fname)
+
+	gene_ids, src, dst = {}, array('i'), array('i')
+	with open(fname, 'r') as f:
+		for line in f:
+			cols = line.rstrip('\r\n').split('\t')
+			if len(cols) <= max(GENE_COLS):
+				continue
+			for gene_col, ids in zip(GENE_COLS, (src, dst)):
+				gene = cols[gene_col]
+				if gene not in gene_ids:
+					gene_ids[gene] = len(gene_ids)
+				ids.append(gene_ids[gene])
+
+	# renumber genes in sorted order then store both directions of each edge sorted by gene
+	names = np.array(sorted(gene_ids), dtype = str)
+	new_id = np.zeros(len(gene_ids), dtype = np.int64)
+	new_id[[ gene_ids[name] for name in names.tolist() ]] = np.arange(len(names))
+	src = new_id[np.frombuffer(src, dtype = np.int32)] if len(src) else np.zeros(0, dtype = np.int64)
+	dst = new_id[np.frombuffer(dst, dtype = np.int32)] if len(dst) else np.zeros(0, dtype = np.int64)
+	keys = np.unique(np.concatenate([src * len(names) + dst, dst * len(names) + src]))
+	rows, neighbors = keys // max(len(names), 1), keys % max(len(names), 1)
+	indptr = np.zeros(len(names) + 1, dtype = np.int64)
+	indptr[1:] = np.cumsum(np.bincount(rows, minlength = len(names)))
+
+	# write to temp directory then rename so a crash never leaves a half built store
+	temp_dir = store_dir.rstrip('/') + '.tmp/'
+	if os.path.exists(temp_dir):
+		shutil.rmtree(temp_dir)
+	os.makedirs(temp_dir)
+	np.save(temp_dir + GENE_FNAME, names)
+	np.save(temp_dir + INDPTR_FNAME, indptr)
+	np.save(temp_dir + NEIGHBOR_FNAME, neighbors.astype(ID_DTYPE))
+	meta = {'version': STORE_VERSION, 'size': stat.st_size, 'mtime': stat.st_mtime, 'num_genes': len(names)}
+	with open(temp_dir + META_FNAME, 'w') as f:
+		json.dump(meta, f)
+
+	if os.path.exists(store_dir):
+		shutil.rmtree(store_dir)
+	os.rename(temp_dir, store_dir)
+	return store_dir
+
+#  input: store (dict) from load_store
+#         gene_name (string)
+# output: neighbors (np.array) [num_neighbors] (string) sorted names of genes with a known edge to gene. empty if
+#           gene is not in store
+def get_neighbors(store, gene_name):
+	gene_id = gr.get_ids(store['registry'], [gene_name])[0]
+	if gene_id < 0:
+		return np.zeros(0, dtype = str)
+	return store['genes'][store['neighbors'][store['indptr'][gene_id]:store['indptr'][gene_id + 1]]]
+
+#  input: store (dict) from load_store
+#         names (np.array) [num_nodes] (string) gene names
+# output: node_a, node_b (np.array) [num_edges] (int) index into names of both genes of each known edge between
+#           genes in names. each undirected edge once with node_a <= node_b (self edges have node_a == node_b)
+#   does: only reads neighbor lists of genes in names
+def get_edges_among(store, names):
+	gene_ids = gr.get_ids(store['registry'], names)
+	node_of = np.full(len(store['genes']), -1, dtype = np.int64) # index into names of each gene in store
+	has_id = np.flatnonzero(gene_ids >= 0)
+	node_of[gene_ids[has_id]] = has_id
+
+	# gather neighbor lists of every gene in names
+	starts, ends = store['indptr'][gene_ids[has_id]], store['indptr'][gene_ids[has_id] + 1]
+	lengths = ends - starts
+	node_a = np.repeat(has_id, lengths)
+	offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+	node_b = node_of[store['neighbors'][offsets]] if len(offsets) else np.zeros(0, dtype = np.int64)
+	keep = (node_b >= 0) & (node_a <= node_b)
+	return node_a[keep], node_b[keep]
+
+
+#
+#   H E L P E R   F U N C T I O N S
+#
+
+# returns True if store with meta information was built from the current version of fname
+def is_fresh(meta, fname):
+	if meta is None:
+		return False
+	stat = os.stat(fname)
+	return meta['version'] == STORE_VERSION and meta['size'] == stat.st_size and meta['mtime'] == stat.st_mtime
+
+# returns meta information (dict) of store or None if there is no store
+def read_meta(store_dir):
+	if not os.path.exists(store_dir + META_FNAME):
+		return None
+	with open(store_dir + META_FNAME, 'r') as f:
+		return json.load(f)
+
+def get_store_dir(fname):
+	return fname + STORE_EXT + '/'
+
+# returns file name of open file f. strings are returned as is
+def get_fname(f):
+	if hasattr(f, 'name'):
+		return f.name
+	return f
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+#   C O M M A N D   L I N E   A R G U M E N T   F U N C T I O N S   #
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+def get_args(argv):
+	parser = argparse.ArgumentParser(prog = 'known_store.py', description = "imports known regulatory network file to an indexed store that shared_network.py loads instead of parsing the file")
+	parser.add_argument('-k', '--known_network_file', type = lambda x: is_valid_file(parser, x), required = True, help = 'tab separated known regulatory network with gene names in cols ' + ' and '.join(map(str, GENE_COLS)))
+	return vars(parser.parse_args(argv))
+
+def is_valid_file(parser, arg):
+	if not os.path.exists(arg):
+		parser.error('The file \"' + str(arg) + '\" could not be found.')
+	else:
+		return open(arg, 'r')
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # #
+#   C A L L   T O   M A I N   F U N C T I O N   #
+# # # # # # # # # # # # # # # # # # # # # # # # #
+
+if __name__ == "__main__":
+	main(sys.argv[1:])
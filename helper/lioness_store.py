@@ -0,0 +1,162 @@
+#     file: lioness_store.py
+#   author: Jesse Eaton and Jacob West-Roberts
+#  created: October 17, 2026
+# modified: October 17, 2026
+#  purpose: Binary store of LIONESS sample networks (directory of memory-mapped arrays). samples are grouped in
+#             chunks and each chunk is laid out edges by samples. one edge across samples is a contiguous run per
+#             chunk and one sample is read from a single chunk. neither needs parsing or loading the rest
+
+
+# # # # # # # # # # #
+#   I M P O R T S   #
+# # # # # # # # # # #
+
+import os     # for manipulating files and folders
+import json   # for reading and writing store meta information
+import shutil # for removing half written stores
+import numpy as np # for manipulating matricies
+
+
+# # # # # # # # # # # # #
+#   C O N S T A N T S   #
+# # # # # # # # # # # # #
+
+STORE_EXT      = '.lion.store'  # store is a directory with this extension
+STORE_VERSION  = 2              # bump when the layout below changes
+CHUNK_SAMPLES  = 64             # samples per chunk. larger makes edge reads cheaper and sample reads dearer
+EDGE_FNAME     = 'edges.npy'    # [num_chunks, num_edges, chunk_samples] (float) forces. edge e of sample s is at
+                                #   [s // chunk_samples, e, s % chunk_samples]. last chunk is padded with 0. edges
+                                #   are gene major (see flatten_network)
+TF_FNAME       = 'tfs.npy'      # [num_tfs] names of rows of each network
+GENE_FNAME     = 'genes.npy'    # [num_genes] names of cols of each network
+BARCODE_FNAME  = 'barcodes.npy' # [num_samples] TCGA barcode of each sample
+META_FNAME     = 'meta.json'    # shape, dtype, chunk size and number of samples written
+PAIRS_FLOAT_FMT   = '%.18e'     # float format of each sample network in LIONESS output (same as np.savetxt)
+PAIRS_BLOCK_EDGES = 10000       # edges of every sample written to LIONESS output at a time
+
+
+# # # # # # # # # # # # #
+#   F U N C T I O N S   #
+# # # # # # # # # # # # #
+
+#  input: dirname (string) directory to write store to. should end in STORE_EXT
+#         tfs (list of string) [num_tfs] names of rows of each network
+#         genes (list of string) [num_genes] names of cols of each network
+#         barcodes (list of string) [num_samples] TCGA barcode of each sample in the order they will be added
+#         dtype (np.dtype) float type of stored forces
+# output: store (dict) writer to pass to add_sample and close_store (or abort_store if inference fails)
+#   does: writes to a temporary directory that replaces dirname on close_store
+def new_store(dirname, tfs, genes, barcodes, dtype = np.float64):
+	dirname = dirname.rstrip('/') + '/'
+	temp_dir = dirname.rstrip('/') + '.tmp/'
+	if os.path.exists(temp_dir):
+		shutil.rmtree(temp_dir)
+	os.makedirs(temp_dir)
+	try:
+		np.save(temp_dir + TF_FNAME, np.array(tfs, dtype = str))
+		np.save(temp_dir + GENE_FNAME, np.array(genes, dtype = str))
+		np.save(temp_dir + BARCODE_FNAME, np.array(barcodes, dtype = str))
+		num_chunks = (len(barcodes) + CHUNK_SAMPLES - 1) // CHUNK_SAMPLES
+		edges = np.lib.format.open_memmap(temp_dir + EDGE_FNAME, mode = 'w+', dtype = dtype,
+		                                  shape = (num_chunks, len(tfs) * len(genes), CHUNK_SAMPLES))
+	except:
+		shutil.rmtree(temp_dir)
+		raise
+	meta = {'version': STORE_VERSION, 'num_tfs': len(tfs), 'num_genes': len(genes), 'num_samples': len(barcodes),
+	        'chunk_samples': CHUNK_SAMPLES, 'dtype': np.dtype(dtype).name, 'num_written': 0}
+	return {'dirname': dirname, 'temp_dir': temp_dir, 'meta': meta, 'edges': edges}
+
+#  input: store (dict) writer from new_store
+#         network (np.array) [num_tfs, num_genes] (float) network of next sample
+#   does: writes network straight to its col of its chunk of the memory-mapped store. nothing is buffered
+def add_sample(store, network):
+	meta = store['meta']
+	s = meta['num_written']
+	if s == meta['num_samples']:
+		raise ValueError('store already has all ' + str(meta['num_samples']) + ' samples')
+	store['edges'][s // CHUNK_SAMPLES, :, s % CHUNK_SAMPLES] = flatten_network(network)
+	meta['num_written'] += 1
+
+#  input: store (dict) writer from new_store. every sample should have been added
+#   does: flushes arrays and moves store to its final directory. temporary directory is removed on any error
+def close_store(store):
+	meta = store['meta']
+	try:
+		if meta['num_written'] != meta['num_samples']:
+			raise ValueError('store has ' + str(meta['num_written']) + ' of ' + str(meta['num_samples']) + ' samples')
+		store['edges'].flush()
+		del store['edges']
+		write_meta(store['temp_dir'], meta)
+		if os.path.exists(store['dirname']):
+			shutil.rmtree(store['dirname'])
+		os.rename(store['temp_dir'], store['dirname'])
+	except:
+		abort_store(store)
+		raise
+
+# removes temporary directory of store (dict) writer from new_store. dirname is left as it was
+def abort_store(store):
+	store.pop('edges', None)
+	if os.path.exists(store['temp_dir']):
+		shutil.rmtree(store['temp_dir'])
+
+#  input: dirname (string) directory of store written by close_store
+# output: store (dict) reader. 'tfs', 'genes', 'barcodes' (np.array) (string) names
+#                              'edges' (np.array) memory-mapped forces. read only
+def open_store(dirname):
+	dirname = dirname.rstrip('/') + '/'
+	with open(dirname + META_FNAME, 'r') as f:
+		meta = json.load(f)
+	if meta['version'] != STORE_VERSION:
+		raise ValueError('store ' + dirname + ' has version ' + str(meta['version']) + ' not ' + str(STORE_VERSION))
+	store = {'meta': meta, 'edges': np.load(dirname + EDGE_FNAME, mmap_mode = 'r')}
+	for key, fname in [('tfs', TF_FNAME), ('genes', GENE_FNAME), ('barcodes', BARCODE_FNAME)]:
+		store[key] = np.load(dirname + fname)
+	store['tf_idx'] = dict((name, i) for i, name in enumerate(store['tfs']))
+	store['gene_idx'] = dict((name, i) for i, name in enumerate(store['genes']))
+	store['barcode_idx'] = dict((name, i) for i, name in enumerate(store['barcodes']))
+	return store
+
+#  input: store (dict) reader from open_store
+#         barcode (string) TCGA barcode of sample
+# output: network (np.array) [num_tfs, num_genes] (float) network of sample
+def get_sample(store, barcode):
+	s, chunk_samples = store['barcode_idx'][barcode], store['meta']['chunk_samples']
+	network = np.array(store['edges'][s // chunk_samples, :, s % chunk_samples]) # strided within one chunk
+	return network.reshape(store['meta']['num_tfs'], store['meta']['num_genes'], order = 'F')
+
+#  input: store (dict) reader from open_store
+#         tf (string) name of row of network
+#         gene (string) name of col of network
+# output: forces (np.array) [num_samples] (float) force of edge from tf to gene in each sample
+def get_edge(store, tf, gene):
+	e = get_edge_index(store['tf_idx'][tf], store['gene_idx'][gene], store['meta']['num_tfs'])
+	return np.array(store['edges'][:, e]).reshape(-1)[:store['meta']['num_samples']] # one run per chunk
+
+#  input: f (file) open file to write to
+#         store (dict) reader from open_store
+#   does: writes one tab separated row per edge with one col per sample (same as pypanda save_lioness_results).
+#           only PAIRS_BLOCK_EDGES edges of every sample are in memory at a time
+def write_pairs(f, store):
+	edges, num_samples = store['edges'], store['meta']['num_samples']
+	for start in xrange(0, edges.shape[1], PAIRS_BLOCK_EDGES):
+		block = edges[:, start:start + PAIRS_BLOCK_EDGES] # [num_chunks, block_edges, chunk_samples]
+		block = np.transpose(block, (1, 0, 2)).reshape(block.shape[1], -1)[:, :num_samples]
+		np.savetxt(f, block, fmt = PAIRS_FLOAT_FMT, delimiter = '\t')
+
+# returns network (np.array) [num_tfs, num_genes] flattened gene major (same edge order as pypanda LIONESS output)
+def flatten_network(network):
+	return np.ravel(network, order = 'F')
+
+# returns index of edge from tf i to gene j in a network from flatten_network
+def get_edge_index(i, j, num_tfs):
+	return j * num_tfs + i
+
+
+#
+#   H E L P E R   F U N C T I O N S
+#
+
+def write_meta(dirname, meta):
+	with open(dirname + META_FNAME, 'w') as f:
+		json.dump(meta, f)
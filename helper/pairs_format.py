@@ -0,0 +1,197 @@
+#     file: pairs_format.py
+#   author: Jesse Eaton and Jacob West-Roberts
+#  created: October 17, 2026
+# modified: October 17, 2026
+#  purpose: Compact binary form of .pairs gene network files. a gene name dictionary plus two int32 gene index
+#             columns and a float32 weight column, all memory-mapped on load
+
+
+# # # # # # # # # # #
+#   I M P O R T S   #
+# # # # # # # # # # #
+
+import sys      # for command line arguments
+import os       # for manipulating files and folders
+import argparse # for command line arguments
+import json     # for reading and writing meta information
+import shutil   # for removing stale binary directories
+import numpy as np # for manipulating matricies
+
+
+# # # # # # # # # # # # #
+#   C O N S T A N T S   #
+# # # # # # # # # # # # #
+
+BIN_EXT       = '.bin'        # binary directory is placed next to .pairs file with this extension
+BIN_VERSION   = 1             # bump to rebuild every binary directory when the layout below changes
+GENE_FNAME    = 'genes.npy'   # [num_genes] gene names. index of each is its gene id
+SRC_FNAME     = 'src.npy'     # [num_edges] (int32) gene id of first col of each edge
+DST_FNAME     = 'dst.npy'     # [num_edges] (int32) gene id of second col of each edge
+WEIGHT_FNAME  = 'weights.npy' # [num_edges] (float32) weight of each edge
+META_FNAME    = 'meta.json'   # source file size and modification time
+ID_DTYPE      = np.int32
+WEIGHT_DTYPE  = np.float32
+BLOCK_SIZE    = 1000000       # edges written to binary arrays at a time
+
+
+# # # # # # # # # # # # #
+#   F U N C T I O N S   #
+# # # # # # # # # # # # #
+
+def main(argv):
+	args = get_args(argv)
+	bin_dir = convert(get_fname(args['pairs_file']), args['output_directory'])
+	print bin_dir
+
+#  input: f (file or string) .pairs file (tab separated gene, gene, weight) or binary directory from convert
+# output: genes (np.array) [num_genes] (string) gene names. gene ids index into this
+#         src (np.array) [num_edges] (int32) gene id of first gene of each edge. memory-mapped
+#         dst (np.array) [num_edges] (int32) gene id of second gene of each edge. memory-mapped
+#         weights (np.array) [num_edges] (float32) weight of each edge. memory-mapped
+#   does: for a .pairs file the binary directory next to it is built first if missing or if the file has changed.
+#           lines with weights that are not numbers (ex. header) are skipped
+def load_pairs(f):
+	fname = get_fname(f)
+	if os.path.isdir(fname):
+		bin_dir = fname.rstrip('/') + '/'
+	else:
+		bin_dir = get_bin_dir(fname)
+		if not is_fresh(read_meta(bin_dir), fname):
+			convert(fname)
+	genes = np.load(bin_dir + GENE_FNAME)
+	src = np.load(bin_dir + SRC_FNAME, mmap_mode = 'r')
+	dst = np.load(bin_dir + DST_FNAME, mmap_mode = 'r')
+	weights = np.load(bin_dir + WEIGHT_FNAME, mmap_mode = 'r')
+	return genes, src, dst, weights
+
+#  input: fname (string) .pairs file
+#         bin_dir (string) directory to write to. next to fname if None
+# output: bin_dir (string) directory the binary pairs were written to
+#   does: streams fname twice (count and name genes then fill) so no string matrix is ever held in memory. genes
+#           are numbered in order of first appearance
+def convert(fname, bin_dir = None):
+	if bin_dir is None:
+		bin_dir = get_bin_dir(fname)
+	bin_dir = bin_dir.rstrip('/') + '/'
+	stat = os.stat(fname)
+
+	gene_ids, num_edges = {}, 0
+	with open(fname, 'r') as f:
+		for line in f:
+			cols = split_line(line)
+			if not is_edge(cols):
+				continue
+			num_edges += 1
+			for gene in cols[:2]:
+				if gene not in gene_ids:
+					gene_ids[gene] = len(gene_ids)
+
+	# write to temp directory then rename so a crash never leaves a half built directory
+	temp_dir = bin_dir.rstrip('/') + '.tmp/'
+	if os.path.exists(temp_dir):
+		shutil.rmtree(temp_dir)
+	os.makedirs(temp_dir)
+	src = np.lib.format.open_memmap(temp_dir + SRC_FNAME, mode = 'w+', dtype = ID_DTYPE, shape = (num_edges,))
+	dst = np.lib.format.open_memmap(temp_dir + DST_FNAME, mode = 'w+', dtype = ID_DTYPE, shape = (num_edges,))
+	weights = np.lib.format.open_memmap(temp_dir + WEIGHT_FNAME, mode = 'w+', dtype = WEIGHT_DTYPE, shape = (num_edges,))
+	with open(fname, 'r') as f:
+		i, block = 0, ([], [], [])
+		for line in f:
+			cols = split_line(line)
+			if not is_edge(cols):
+				continue
+			block[0].append(gene_ids[cols[0]])
+			block[1].append(gene_ids[cols[1]])
+			block[2].append(float(cols[2]))
+			if len(block[0]) == BLOCK_SIZE:
+				i = write_block(src, dst, weights, i, block)
+				block = ([], [], [])
+		write_block(src, dst, weights, i, block)
+	for arr in [src, dst, weights]:
+		arr.flush()
+	del src, dst, weights
+
+	genes = [None] * len(gene_ids)
+	for gene, i in gene_ids.iteritems():
+		genes[i] = gene
+	np.save(temp_dir + GENE_FNAME, np.array(genes, dtype = str))
+	meta = {'version': BIN_VERSION, 'size': stat.st_size, 'mtime': stat.st_mtime, 'num_edges': num_edges}
+	with open(temp_dir + META_FNAME, 'w') as f:
+		json.dump(meta, f)
+
+	if os.path.exists(bin_dir):
+		shutil.rmtree(bin_dir)
+	os.rename(temp_dir, bin_dir)
+	return bin_dir
+
+
+#
+#   H E L P E R   F U N C T I O N S
+#
+
+# writes block (tuple of lists) of src ids, dst ids and weights starting at edge i. returns index after block
+def write_block(src, dst, weights, i, block):
+	j = i + len(block[0])
+	src[i:j], dst[i:j], weights[i:j] = block
+	return j
+
+# returns True if cols of a .pairs line are gene, gene and a weight that is a number
+def is_edge(cols):
+	if len(cols) < 3:
+		return False
+	try:
+		float(cols[2])
+	except ValueError:
+		return False
+	return True
+
+# returns True if binary directory with meta information was built from the current version of fname
+def is_fresh(meta, fname):
+	if meta is None:
+		return False
+	stat = os.stat(fname)
+	return meta['version'] == BIN_VERSION and meta['size'] == stat.st_size and meta['mtime'] == stat.st_mtime
+
+# returns meta information (dict) of binary directory or None if there is none
+def read_meta(bin_dir):
+	if not os.path.exists(bin_dir + META_FNAME):
+		return None
+	with open(bin_dir + META_FNAME, 'r') as f:
+		return json.load(f)
+
+def get_bin_dir(fname):
+	return fname + BIN_EXT + '/'
+
+# returns file name of open file f. strings are returned as is
+def get_fname(f):
+	if hasattr(f, 'name'):
+		return f.name
+	return f
+
+def split_line(line):
+	return line.rstrip('\r\n').split('\t')
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+#   C O M M A N D   L I N E   A R G U M E N T   F U N C T I O N S   #
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+def get_args(argv):
+	parser = argparse.ArgumentParser(prog = 'pairs_format.py', description = "converts .pairs gene network file to a binary directory that plot_ego_graphs.py and shared_network.py load instead of parsing the .pairs file")
+	parser.add_argument('-p', '--pairs_file', type = lambda x: is_valid_file(parser, x), required = True, help = 'tab separated gene, gene, weight file. ex: PANDA output')
+	parser.add_argument('-o', '--output_directory', help = 'directory to write binary pairs to. defaults to ' + BIN_EXT + ' directory next to pairs file, which is found automatically')
+	return vars(parser.parse_args(argv))
+
+def is_valid_file(parser, arg):
+	if not os.path.exists(arg):
+		parser.error('The file \"' + str(arg) + '\" could not be found.')
+	else:
+		return open(arg, 'r')
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # #
+#   C A L L   T O   M A I N   F U N C T I O N   #
+# # # # # # # # # # # # # # # # # # # # # # # # #
+
+if __name__ == "__main__":
+	main(sys.argv[1:])
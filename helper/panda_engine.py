@@ -0,0 +1,367 @@
+#     file: panda_engine.py
+#   author: Jesse Eaton and Jacob West-Roberts
+#  created: October 16, 2026
+# modified: October 16, 2026
+#  purpose: In memory PANDA and LIONESS gene regulatory network inference. same updates as pypanda but
+#             takes an expression matrix (or memory-mapped cache) directly instead of a file
+
+
+# # # # # # # # # # #
+#   I M P O R T S   #
+# # # # # # # # # # #
+
+import os              # for manipulating files and folders
+import math            # for exponent of diagonal update
+import shutil          # for removing shared memory files
+import tempfile        # for shared memory files
+import multiprocessing # for running LIONESS samples in parallel
+import numpy as np # for manipulating matricies
+import scipy.stats as st # for z-scores when normalizing networks
+import gene_registry as gr # for matching prior network names by integer gene id
+
+
+# # # # # # # # # # # # #
+#   C O N S T A N T S   #
+# # # # # # # # # # # # #
+
+ENGINE_VERSION = 1     # bump whenever network values this module makes change. batch runs redo jobs made before
+ALPHA          = 0.1   # learning rate of message passing updates
+TOLERANCE      = 0.001 # stop message passing once mean absolute change (hamming distance) is below this
+PAIRS_HEADER   = 'tf\tgene\tforce'
+MEM_BUDGET      = 1024 ** 3 # default bytes for tiles of tiled_correlation
+CORR_EXT        = '.corr.npy' # memory-mapped coexpression network written next to PANDA output
+SHARED_MEM_DIR  = '/dev/shm' # memory backed file system for arrays shared with worker processes. if it exists
+SHARED_EXPR_FNAME    = 'expr.npy'
+SHARED_NETWORK_FNAME = 'network.npy'
+SHARED_MEAN_FNAME    = 'mean.npy'
+SHARED_SCATTER_FNAME = 'scatter.npy'
+
+
+# # # # # # # # # # # # #
+#   F U N C T I O N S   #
+# # # # # # # # # # # # #
+
+#  input: expr (np.array) [num_genes, num_samples] (float) may be memory-mapped
+#         motif (np.array) [num_tfs, num_genes] (float) prior TF to gene edges. None for coexpression only
+#         ppi (np.array) [num_tfs, num_tfs] (float) prior TF to TF interactions. identity if None
+#         dtype (np.dtype) np.float64 or np.float32 for all network matricies
+#         tol (float) convergence tolerance of message passing
+# output: network (np.array) [num_tfs, num_genes] (float) PANDA network. [num_genes, num_genes] coexpression
+#           network if no motif is given (same as pypanda)
+def panda(expr, motif = None, ppi = None, dtype = np.float64, tol = TOLERANCE):
+	return panda_from_corr(correlation(expr, dtype), motif, ppi, dtype, tol)
+
+#  input: corr (np.array) [num_genes, num_genes] (float) coexpression network. changed in place
+#         motif, ppi, dtype, tol see panda
+# output: network (np.array) see panda
+def panda_from_corr(corr, motif = None, ppi = None, dtype = np.float64, tol = TOLERANCE):
+	if motif is None:
+		return corr
+	if ppi is None:
+		ppi = np.identity(len(motif))
+	motif = normalize_network(np.array(motif, dtype = dtype))
+	ppi = normalize_network(np.array(ppi, dtype = dtype))
+	return panda_loop(normalize_network(corr), motif, ppi, tol)
+
+#  input: expr (np.array) [num_genes, num_samples] (float)
+#         i (int) sample to infer network for
+#         network (np.array) PANDA network over all samples from panda
+#         motif, ppi, dtype, tol see panda
+#         scatter (tuple) (mean, scatter_matrix) of all samples from get_scatter. if given, coexpression of all
+#           samples except i is a rank-one downdate of scatter_matrix (O(num_genes^2)) instead of being recomputed
+#           from the remaining samples (O(num_samples*num_genes^2))
+# output: lioness_network (np.array) same shape as network. network of sample i from linear interpolation between
+#           network over all samples and network over all samples except i
+def lioness(expr, i, network, motif = None, ppi = None, dtype = np.float64, tol = TOLERANCE, scatter = None):
+	num_samples = expr.shape[1]
+	if scatter is None:
+		idxs = np.delete(np.arange(num_samples), i) # all samples except i
+		corr = correlation(expr[:, idxs], dtype)
+	else:
+		corr = loo_correlation(scatter[0], scatter[1], num_samples, expr[:, i], dtype)
+	subset_network = panda_from_corr(corr, motif, ppi, dtype, tol)
+	return num_samples * (network - subset_network) + subset_network
+
+#  input: expr (np.array) [num_genes, num_samples] (float)
+#         network, motif, ppi, dtype, tol, scatter see lioness
+#         num_procs (int) number of worker processes
+# output: lioness_networks (generator of np.array) network of each sample from lioness. in sample order
+#   does: expr and network are written once to memory backed .npy files that every worker memory-maps, so they
+#           are never pickled to workers. results are the same as calling lioness for each sample in turn
+def lioness_pool(expr, network, motif = None, ppi = None, dtype = np.float64, tol = TOLERANCE, num_procs = 1, scatter = None):
+	shared_dir = tempfile.mkdtemp(dir = SHARED_MEM_DIR if os.path.isdir(SHARED_MEM_DIR) else None)
+	try:
+		np.save(os.path.join(shared_dir, SHARED_EXPR_FNAME), expr)
+		np.save(os.path.join(shared_dir, SHARED_NETWORK_FNAME), network)
+		if scatter is not None:
+			np.save(os.path.join(shared_dir, SHARED_MEAN_FNAME), scatter[0])
+			np.save(os.path.join(shared_dir, SHARED_SCATTER_FNAME), scatter[1])
+		pool = multiprocessing.Pool(num_procs, init_lioness_worker, (shared_dir, motif, ppi, dtype, tol))
+		try:
+			for lioness_network in pool.imap(lioness_worker, xrange(0, expr.shape[1])):
+				yield lioness_network
+		finally:
+			pool.terminate()
+			pool.join()
+	finally:
+		shutil.rmtree(shared_dir)
+
+#  input: expr (np.array) [num_genes, num_samples] (float)
+#         dtype (np.dtype) float type of output
+# output: corr (np.array) [num_genes, num_genes] (float) pearson correlation of each pair of genes. genes with no
+#           variance have correlation 0 with all other genes and 1 with themselves (same as pypanda)
+def correlation(expr, dtype = np.float64):
+	z, no_var = standardize(expr, dtype)
+	corr = z.dot(z.T) # BLAS
+	if no_var.any():
+		np.fill_diagonal(corr, 1)
+	return corr
+
+#  input: expr (np.array) [num_genes, num_samples] (float) may be memory-mapped
+#         dtype (np.dtype) float type of output
+#         mem_budget (int) bytes the tiles and the two blocks of genes they come from may use. the standardized
+#           [num_genes, num_samples] expression is held in memory on top of this
+#         shard (int) only tiles whose index (in the order below) modulo num_shards is shard are computed
+#         num_shards (int) number of shards tiles are dealt to. 1 computes every tile
+# output: tiles (generator of tuple) (row_start, col_start, tile) for each tile on or above the diagonal. tile
+#           (np.array) [block_rows, block_cols] is correlation of genes row_start: with genes col_start:.
+#           same values as correlation. rest of the matrix is the transpose of these tiles
+def tiled_correlation(expr, dtype = np.float64, mem_budget = MEM_BUDGET, shard = 0, num_shards = 1):
+	z, no_var = standardize(expr, dtype)
+	num_genes = len(z)
+	block = get_block_size(num_genes, z.shape[1], z.itemsize, mem_budget)
+	for k, (i, j) in enumerate(get_tile_starts(num_genes, block)):
+		if k % num_shards != shard:
+			continue
+		tile = z[i:i+block].dot(z[j:j+block].T)
+		if i == j and no_var.any(): # same rule as correlation so the diagonals match exactly
+			np.fill_diagonal(tile, 1)
+		yield i, j, tile
+
+#  input: expr, dtype, mem_budget see tiled_correlation
+#         fname (string) .npy file to write correlation to
+# output: corr (np.array) [num_genes, num_genes] (float) memory-mapped correlation. same values as correlation
+def correlation_memmap(expr, fname, dtype = np.float64, mem_budget = MEM_BUDGET):
+	num_genes = expr.shape[0]
+	corr = np.lib.format.open_memmap(fname, mode = 'w+', dtype = dtype, shape = (num_genes, num_genes))
+	for i, j, tile in tiled_correlation(expr, dtype, mem_budget):
+		corr[i:i+len(tile), j:j+tile.shape[1]] = tile
+		if i != j:
+			corr[j:j+tile.shape[1], i:i+len(tile)] = tile.T
+	corr.flush()
+	return corr
+
+#  input: f (file) open file to write to
+#         genes (list of string) [num_genes] names of rows of expr
+#         expr, dtype, mem_budget see tiled_correlation
+#         threshold (float) only edges with absolute correlation at least this are written
+# output: num_edges (int) number of edges written
+#   does: writes header then one gene, gene, force line per edge with the first gene before the second in genes.
+#           full correlation matrix is never in memory
+def write_correlation_edges(f, genes, expr, threshold, dtype = np.float64, mem_budget = MEM_BUDGET):
+	f.write(PAIRS_HEADER + '\n')
+	num_edges = 0
+	for i, j, tile in tiled_correlation(expr, dtype, mem_budget):
+		rows, cols, forces = get_tile_edges(i, j, tile, threshold)
+		write_edges(f, genes, rows, cols, forces)
+		num_edges += len(forces)
+	return num_edges
+
+#  input: i, j, tile (int, int, np.array) tile from tiled_correlation
+#         threshold (float) only edges with absolute correlation at least this are kept
+# output: rows (np.array) [num_edges] (int) index of first gene of each edge. row major order within tile
+#         cols (np.array) [num_edges] (int) index of second gene of each edge. always after first gene
+#         forces (np.array) [num_edges] (float) correlation of each edge
+def get_tile_edges(i, j, tile, threshold):
+	rows, cols = np.nonzero(np.abs(tile) >= threshold)
+	keep = rows + i < cols + j # upper triangle. no self edges
+	rows, cols = rows[keep], cols[keep]
+	return rows + i, cols + j, tile[rows, cols]
+
+#  input: f (file) open file to write to
+#         genes (list of string) [num_genes] names of genes
+#         rows, cols, forces (np.array) edges from get_tile_edges
+#   does: writes one gene, gene, force line per edge
+def write_edges(f, genes, rows, cols, forces):
+	f.write(''.join([ genes[r] + '\t' + genes[c] + '\t' + repr(force) + '\n'
+	                  for r, c, force in zip(rows.tolist(), cols.tolist(), forces.tolist()) ]))
+
+#  input: expr (np.array) [num_genes, num_samples] (float)
+#         dtype (np.dtype) float type of output
+# output: mean (np.array) [num_genes] mean expression of each gene over all samples
+#         scatter_matrix (np.array) [num_genes, num_genes] sum over samples of outer product of centered expression
+def get_scatter(expr, dtype = np.float64):
+	z = np.array(expr, dtype = dtype)
+	mean = z.mean(axis = 1)
+	z -= mean[:, np.newaxis]
+	return mean, z.dot(z.T)
+
+#  input: mean (np.array) [num_genes] from get_scatter
+#         scatter_matrix (np.array) [num_genes, num_genes] from get_scatter. not changed
+#         num_samples (int) number of samples mean and scatter_matrix are over
+#         x (np.array) [num_genes] expression of sample to leave out
+#         dtype (np.dtype) float type of output
+# output: corr (np.array) [num_genes, num_genes] pearson correlation of all samples except x. scatter of remaining
+#           samples is scatter_matrix - n/(n-1) * (x-mean)(x-mean)^T. same handling of no variance as correlation
+def loo_correlation(mean, scatter_matrix, num_samples, x, dtype = np.float64):
+	d = np.asarray(x, dtype = dtype) - mean
+	corr = scatter_matrix - (num_samples / (num_samples - 1.0)) * np.outer(d, d).astype(dtype, copy = False)
+	std = np.sqrt(np.maximum(np.diag(corr), 0)) # clip round off below 0
+	with np.errstate(invalid = 'ignore', divide = 'ignore'):
+		corr /= std[:, np.newaxis]
+		corr /= std[np.newaxis, :]
+	if np.isnan(corr).any() or np.isinf(corr).any():
+		np.fill_diagonal(corr, 1)
+		corr = np.nan_to_num(corr)
+		corr[np.abs(corr) > 1] = 0 # infinite from dividing by 0
+	return corr
+
+#  input: corr (np.array) [num_genes, num_genes] normalized coexpression network. changed in place
+#         motif (np.array) [num_tfs, num_genes] normalized prior TF to gene edges. changed in place
+#         ppi (np.array) [num_tfs, num_tfs] normalized prior TF to TF interactions. changed in place
+#         tol (float) convergence tolerance
+# output: motif (np.array) [num_tfs, num_genes] PANDA network once messages between the three networks converge
+def panda_loop(corr, motif, ppi, tol = TOLERANCE):
+	num_tfs, num_genes = motif.shape
+	step = 0
+	hamming = 1
+	while hamming > tol:
+		W = 0.5 * (t_function(ppi, motif) + t_function(motif, corr)) # responsibility and availability
+		hamming = np.abs(motif - W).mean()
+		motif *= (1 - ALPHA)
+		motif += ALPHA * W
+
+		if hamming > tol:
+			new_ppi = t_function(motif)
+			update_diagonal(new_ppi, num_tfs, step)
+			ppi *= (1 - ALPHA)
+			ppi += ALPHA * new_ppi
+
+			new_corr = t_function(motif.T)
+			update_diagonal(new_corr, num_genes, step)
+			corr *= (1 - ALPHA)
+			corr += ALPHA * new_corr
+		step += 1
+	return motif
+
+#  input: x (np.array) [num_rows, num_cols]
+# output: x_norm (np.array) [num_rows, num_cols] average of row and column z-scores. falls back to z-score over
+#           all of x where a row or column has no variance (same as pypanda)
+def normalize_network(x):
+	with np.errstate(invalid = 'ignore', divide = 'ignore'):
+		norm_col = st.zscore(x, axis = 0)
+		if x.shape[0] == x.shape[1] and np.allclose(x, x.T):
+			norm_row = norm_col.T
+		else:
+			norm_row = st.zscore(x, axis = 1)
+		norm_total = (x - np.mean(x)) / np.std(x, ddof = 1) # not the same as z-score over all of x
+	normalized = (norm_col + norm_row) / math.sqrt(2)
+	nan_col = np.isnan(norm_col)
+	nan_row = np.isnan(norm_row)
+	normalized[nan_col] = (norm_row[nan_col] + norm_total[nan_col]) / math.sqrt(2)
+	normalized[nan_row] = (norm_col[nan_row] + norm_total[nan_row]) / math.sqrt(2)
+	normalized[nan_col & nan_row] = 2 * norm_total[nan_col & nan_row] / math.sqrt(2)
+	return normalized.astype(x.dtype, copy = False)
+
+#  input: f (file) prior network. each line is tab separated: name_a, name_b, weight
+#         row_names (list of string) names for rows of output. None to use sorted unique names in first col
+#         col_names (list of string) names for cols of output
+#         symmetric (bool) True to also set [b, a] for each edge (PPI)
+# output: prior (np.array) [num_rows, num_cols] (float) edges with names not in row_names or col_names are skipped.
+#           when an entry is set more than once the last edge in f wins
+#         row_names (list of string)
+#   does: names are matched to integer ids once for all edges
+def read_prior(f, row_names, col_names, symmetric = False):
+	edges = np.array([ line.rstrip('\r\n').split('\t') for line in f if line.strip() ], dtype = str).reshape(-1, 3)
+	if row_names is None:
+		row_names = sorted(set(edges[:, 0].tolist()))
+	rows = gr.get_ids(gr.new_registry(row_names), edges[:, 0])
+	cols = gr.get_ids(gr.new_registry(col_names), edges[:, 1])
+	keep = (rows >= 0) & (cols >= 0)
+	rows, cols, weights = rows[keep], cols[keep], edges[keep, 2].astype(float)
+	if symmetric: # [b, a] right after [a, b] of each edge
+		rows, cols = np.column_stack([rows, cols]).ravel(), np.column_stack([cols, rows]).ravel()
+		weights = np.repeat(weights, 2)
+	prior = np.identity(len(row_names)) if symmetric else np.zeros([len(row_names), len(col_names)])
+	keys = rows.astype(np.int64) * len(col_names) + cols
+	_, last = np.unique(keys[::-1], return_index = True) # last edge setting each entry
+	last = len(keys) - 1 - last
+	prior[rows[last], cols[last]] = weights[last]
+	return prior, row_names
+
+#  input: f (file) open file to write to
+#         tfs (list of string) [num_tfs] names of rows of network
+#         genes (list of string) [num_genes] names of cols of network
+#         network (np.array) [num_tfs, num_genes] (float)
+#   does: writes header then one tf, gene, force line per edge. gene major order (same as pypanda)
+def write_pairs(f, tfs, genes, network):
+	f.write(PAIRS_HEADER + '\n')
+	for i, gene in enumerate(genes):
+		forces = network[:, i].tolist()
+		f.write(''.join([ tf + '\t' + gene + '\t' + repr(force) + '\n' for tf, force in zip(tfs, forces) ]))
+
+
+
+#
+#   H E L P E R   F U N C T I O N S
+#
+
+# inputs of lioness shared by every sample. set once in each worker process by init_lioness_worker
+worker_inputs = {}
+
+def init_lioness_worker(shared_dir, motif, ppi, dtype, tol):
+	worker_inputs['expr'] = np.load(os.path.join(shared_dir, SHARED_EXPR_FNAME), mmap_mode = 'r')
+	worker_inputs['network'] = np.load(os.path.join(shared_dir, SHARED_NETWORK_FNAME), mmap_mode = 'r')
+	worker_inputs['motif'], worker_inputs['ppi'] = motif, ppi
+	worker_inputs['dtype'], worker_inputs['tol'] = dtype, tol
+	worker_inputs['scatter'] = None
+	if os.path.exists(os.path.join(shared_dir, SHARED_SCATTER_FNAME)):
+		worker_inputs['scatter'] = (np.load(os.path.join(shared_dir, SHARED_MEAN_FNAME)),
+		                            np.load(os.path.join(shared_dir, SHARED_SCATTER_FNAME), mmap_mode = 'r'))
+
+def lioness_worker(i):
+	w = worker_inputs
+	return lioness(w['expr'], i, w['network'], w['motif'], w['ppi'], w['dtype'], w['tol'], w['scatter'])
+
+#  input: expr (np.array) [num_genes, num_samples] (float) may be memory-mapped
+#         dtype (np.dtype) float type of output
+# output: z (np.array) [num_genes, num_samples] (float) rows centered and scaled to unit length so z.dot(z.T) is
+#           correlation. rows of genes with no variance (or missing values) are 0
+#         no_var (np.array) [num_genes] (bool) True for genes with no variance (or missing values)
+def standardize(expr, dtype = np.float64):
+	z = np.array(expr, dtype = dtype)
+	z -= z.mean(axis = 1, keepdims = True)
+	norm = np.sqrt(np.square(z).sum(axis = 1, keepdims = True))
+	with np.errstate(invalid = 'ignore'):
+		no_var = ~(norm[:, 0] > 0)
+	norm[no_var] = 1
+	z /= norm
+	z[no_var] = 0
+	return z, no_var
+
+# largest number of genes per block so a [block, block] tile and two [block, num_samples] blocks fit in mem_budget
+def get_block_size(num_genes, num_samples, itemsize, mem_budget):
+	items = mem_budget // itemsize
+	block = int(math.sqrt(num_samples ** 2 + items) - num_samples) # solves block^2 + 2*block*num_samples = items
+	return min(max(block, 1), num_genes)
+
+# returns (row_start, col_start) of each tile on or above the diagonal in the order tiled_correlation makes them
+def get_tile_starts(num_genes, block):
+	return [ (i, j) for i in xrange(0, num_genes, block) for j in xrange(i, num_genes, block) ]
+
+# tanimoto similarity between rows of x and cols of y (rows of x and x.T if y is None)
+def t_function(x, y = None):
+	if y is None:
+		a = np.dot(x, x.T)
+		s = np.square(x).sum(axis = 1)
+		a /= np.sqrt(s + s.reshape(-1, 1) - np.abs(a))
+	else:
+		a = np.dot(x, y)
+		a /= np.sqrt(np.square(y).sum(axis = 0) + np.square(x).sum(axis = 1).reshape(-1, 1) - np.abs(a))
+	return a
+
+# sets diagonal of square x in place to scaled standard deviation of its off diagonal values
+def update_diagonal(x, num, step):
+	np.fill_diagonal(x, np.nan)
+	diagonal_std = np.nanstd(x, 1)
+	np.fill_diagonal(x, diagonal_std * num * math.exp(2 * ALPHA * step))
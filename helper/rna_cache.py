@@ -0,0 +1,219 @@
+#     file: rna_cache.py
+#   author: Jesse Eaton and Jacob West-Roberts
+#  created: October 16, 2026
+# modified: October 16, 2026
+#  purpose: One time conversion of RNA sequence .txt files to a binary cache (float matrix plus
+#             barcode and gene name index files) that is memory-mapped on every later load
+
+
+# # # # # # # # # # #
+#   I M P O R T S   #
+# # # # # # # # # # #
+
+import sys      # for command line arguments
+import os       # for manipulating files and folders
+import argparse # for command line arguments
+import json     # for reading and writing cache meta information
+import shutil   # for removing stale cache directories
+import numpy as np # for manipulating matricies
+
+
+# # # # # # # # # # # # #
+#   C O N S T A N T S   #
+# # # # # # # # # # # # #
+
+CACHE_EXT     = '.cache'         # cache directory is placed next to RNA sequence file with this extension
+CACHE_VERSION = 2                # bump to invalidate every cache when the layout below changes
+EXPR_FNAME    = 'expr.npy'       # [num_rows, num_cols] float expression values
+TEXT_FNAME    = 'text.npy'       # [num_rows, num_cols] expression values as written in source file. for output
+BARCODE_FNAME = 'barcodes.npy'   # [num_samples] TCGA barcodes
+GENE_FNAME    = 'genes.npy'      # [num_genes] gene names. ex: 'APOBEC3B|9582'
+META_FNAME    = 'meta.json'      # source file size, modification time and header information
+EXPR_DTYPE    = np.float64
+
+
+# # # # # # # # # # # # #
+#   F U N C T I O N S   #
+# # # # # # # # # # # # #
+
+def main(argv):
+	args = get_args(argv)
+	cache_dir = build_cache(get_fname(args['rna_seq_file']), args['genes_by_samples'])
+	print cache_dir
+
+#  input: f (file or string) RNA sequence data. first row is header with gene names. first col is TCGA barcodes
+#         genes_by_samples (bool) True if rows of f are genes and cols are samples (raw TCGA layout with a
+#                                 second 'normalized_count' header row)
+# output: header (np.array) [num_genes+1] (string) header row of samples by genes RNA sequence data
+#         barcodes (np.array) [num_samples] (string) TCGA barcode of each sample
+#         expr (np.array) [num_samples, num_genes] (float) memory-mapped. read only
+#   does: builds cache first if missing or if f has changed since cache was built
+def load_rna_seq(f, genes_by_samples = False):
+	fname = get_fname(f)
+	cache_dir = get_cache_dir(fname)
+	meta = read_meta(cache_dir)
+	if not is_fresh(meta, fname, genes_by_samples):
+		build_cache(fname, genes_by_samples)
+		meta = read_meta(cache_dir)
+	barcodes = np.load(cache_dir + BARCODE_FNAME)
+	genes = np.load(cache_dir + GENE_FNAME)
+	expr = np.load(cache_dir + EXPR_FNAME, mmap_mode = 'r')
+	if genes_by_samples:
+		expr = expr.T # view. stored as genes by samples
+	header = np.concatenate([np.array([meta['corner']], dtype = str), genes]) # widens to fit either
+	return header, barcodes, expr
+
+#  input: f (file or string) RNA sequence data. see load_rna_seq
+#         genes_by_samples (bool) see load_rna_seq
+# output: text (np.array) [num_samples, num_genes] (string) memory-mapped. read only. expression values exactly as
+#           written in f so output made from the cache has the same text as output streamed from f
+def load_rna_text(f, genes_by_samples = False):
+	fname = get_fname(f)
+	cache_dir = get_cache_dir(fname)
+	if not is_fresh(read_meta(cache_dir), fname, genes_by_samples):
+		build_cache(fname, genes_by_samples)
+	text = np.load(cache_dir + TEXT_FNAME, mmap_mode = 'r')
+	if genes_by_samples:
+		text = text.T # view. stored as genes by samples
+	return text
+
+#  input: fname (string) RNA sequence data file
+#         genes_by_samples (bool) see load_rna_seq
+# output: cache_dir (string) directory the cache was written to
+#   does: streams fname twice (count then fill) so no string matrix is ever held in memory. temp directory is removed
+#           if fname can not be parsed
+def build_cache(fname, genes_by_samples = False):
+	cache_dir = get_cache_dir(fname)
+	stat = os.stat(fname)
+	num_skip = 2 if genes_by_samples else 1 # header rows before first row of values
+
+	num_rows, num_cols, width = 0, 0, 1
+	with open(fname, 'r') as f:
+		header = split_line(f.readline())
+		for _ in xrange(1, num_skip):
+			f.readline()
+		for line in f:
+			if line.strip():
+				num_rows += 1
+				width = max(width, max(map(len, split_line(line)[1:]) or [0]))
+	num_cols = len(header) - 1
+
+	# write to temp directory then rename so a crash never leaves a half built cache
+	temp_dir = cache_dir.rstrip('/') + '.tmp/'
+	if os.path.exists(temp_dir):
+		shutil.rmtree(temp_dir)
+	os.makedirs(temp_dir)
+	try:
+		expr = np.lib.format.open_memmap(temp_dir + EXPR_FNAME, mode = 'w+', dtype = EXPR_DTYPE, shape = (num_rows, num_cols))
+		text = np.lib.format.open_memmap(temp_dir + TEXT_FNAME, mode = 'w+', dtype = 'S' + str(width), shape = (num_rows, num_cols))
+		row_names = []
+		with open(fname, 'r') as f:
+			for _ in xrange(0, num_skip):
+				f.readline()
+			i = 0
+			for line in f:
+				if not line.strip():
+					continue
+				cols = split_line(line)
+				row_names.append(cols[0])
+				expr[i] = np.array(cols[1:], dtype = EXPR_DTYPE)
+				text[i] = cols[1:]
+				i += 1
+		expr.flush()
+		text.flush()
+		del expr, text
+	except:
+		shutil.rmtree(temp_dir)
+		raise
+
+	if genes_by_samples:
+		barcodes, genes = header[1:], row_names
+	else:
+		barcodes, genes = row_names, header[1:]
+	np.save(temp_dir + BARCODE_FNAME, np.array(barcodes, dtype = str))
+	np.save(temp_dir + GENE_FNAME, np.array(genes, dtype = str))
+	meta = {'version': CACHE_VERSION, 'size': stat.st_size, 'mtime': stat.st_mtime,
+	        'genes_by_samples': genes_by_samples, 'corner': header[0]}
+	with open(temp_dir + META_FNAME, 'w') as f:
+		json.dump(meta, f)
+
+	if os.path.exists(cache_dir):
+		shutil.rmtree(cache_dir)
+	os.rename(temp_dir, cache_dir)
+	return cache_dir
+
+#  input: f (file) open file to write to
+#         header (np.array) [num_genes+1] (string) header row
+#         barcodes (np.array) [num_samples] (string)
+#         text (np.array) [num_samples, num_genes] (string) expression values as text. ex: from load_rna_text
+#         rows (iterable of int) rows of barcodes and text to write. writes all rows if None
+#         cols (np.array) [num_cols_to_write] (int) columns of text to write. writes all columns if None
+#   does: writes tab separated RNA sequence data one row at a time so text is never copied. values are written as
+#           is so output has the same text as the source file
+def write_rna_seq(f, header, barcodes, text, rows = None, cols = None):
+	if rows is None:
+		rows = xrange(0, len(barcodes))
+	if cols is None:
+		cols = slice(None)
+	else:
+		header = header[np.insert(np.asarray(cols) + 1, 0, 0)] # keep TCGA barcode header
+	f.write('\t'.join(header) + '\n')
+	for i in rows:
+		f.write(barcodes[i] + '\t' + '\t'.join(text[i, cols].tolist()) + '\n')
+
+
+#
+#   H E L P E R   F U N C T I O N S
+#
+
+# returns True if cache with meta information was built from the current version of fname
+def is_fresh(meta, fname, genes_by_samples):
+	if meta is None:
+		return False
+	stat = os.stat(fname)
+	return meta['version'] == CACHE_VERSION and meta['size'] == stat.st_size and \
+	       meta['mtime'] == stat.st_mtime and meta['genes_by_samples'] == genes_by_samples
+
+# returns meta information (dict) of cache or None if there is no cache
+def read_meta(cache_dir):
+	if not os.path.exists(cache_dir + META_FNAME):
+		return None
+	with open(cache_dir + META_FNAME, 'r') as f:
+		return json.load(f)
+
+def get_cache_dir(fname):
+	return fname + CACHE_EXT + '/'
+
+# returns file name of open file f. strings are returned as is
+def get_fname(f):
+	if hasattr(f, 'name'):
+		return f.name
+	return f
+
+def split_line(line):
+	return line.rstrip('\r\n').split('\t')
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+#   C O M M A N D   L I N E   A R G U M E N T   F U N C T I O N S   #
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+def get_args(argv):
+	parser = argparse.ArgumentParser(prog = 'rna_cache.py', description = "converts RNA sequence .txt file to a binary cache that all other scripts load instead of parsing the .txt file")
+	parser.add_argument('-r', '--rna_seq_file', type = lambda x: is_valid_file(parser, x), required = True, help = 'file containing RNA sequence data. rows are samples and cols are genes unless -g is set')
+	parser.add_argument('-g', '--genes_by_samples', action = 'store_true', help = 'set if rows of input file are genes and cols are samples (raw TCGA layout)')
+	return vars(parser.parse_args(argv))
+
+def is_valid_file(parser, arg):
+	if not os.path.exists(arg):
+		parser.error('The file \"' + str(arg) + '\" could not be found.')
+	else:
+		return open(arg, 'r')
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # #
+#   C A L L   T O   M A I N   F U N C T I O N   #
+# # # # # # # # # # # # # # # # # # # # # # # # #
+
+if __name__ == "__main__":
+	main(sys.argv[1:])
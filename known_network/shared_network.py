@@ -14,15 +14,24 @@ import sys      # for command line arguments
 import os       # for manipulating files and folders
 import argparse # for command line arguments
 import numpy as np              # for manipulating matricies
-import networkx as nx           # for creating a graph
+import networkx as nx           # for drawing ego graph
 import matplotlib.pyplot as plt # for plotting and saving plots
 
+# local modules
+sys.path.insert(0, '../helper/')
+import pairs_format as pf # for loading .pairs files from binary form
+import csr_graph as cg    # for building gene graphs from edge arrays
+import gene_registry as gr # for gene symbols and integer gene ids
+import known_store as ks   # for loading known network from its indexed store
+
 
 # # # # # # # # # # # # #
 #   C O N S T A N T S   #
 # # # # # # # # # # # # #
 
 EGO_GRAPH_GENE = 'SPI1' # gene name for gene to plot on ego graph
+EDGE_THRESH = 0.776 # default absolute weight an inferred edge needs
+SWEEP_HEADER = 'threshold\tinferred_edges\tshared_edges\tprecision\trecall'
 # EGO_GRAPH_GENE = 'SLA2'
 
 
@@ -33,89 +42,186 @@ EGO_GRAPH_GENE = 'SPI1' # gene name for gene to plot on ego graph
 def main(argv):
 	args = get_args(argv)
 
-	inf_gene_pairs = np.genfromtxt(args['reg_net_file'], dtype = str, delimiter = '\t')
-	large_known_net = np.genfromtxt(args['known_network_file'], dtype = str, delimiter = '\t')
-	
+	inf_gene_pairs = pf.load_pairs(args['reg_net_file'])
+	known_net = ks.load_store(args['known_network_file'])
+
 	# get set of gene names that are in both inferred and known networks
-	inf_gene_set = get_inf_gene_set(inf_gene_pairs)
-	kno_gene_set = set(large_known_net[:, (0, 2)].flat) # 0th an 2nd col are gene names
+	registry = gr.new_registry(inf_gene_pairs[0]) # symbol of each gene in inferred network
+	inf_gene_set = get_inf_gene_set(inf_gene_pairs, registry)
+	kno_gene_set = set(known_net['genes'].tolist())
 	gene_set = inf_gene_set.intersection(kno_gene_set)
 
-	inf_graph = get_inf_graph(inf_gene_pairs, gene_set, 0.776)
-	kno_graph = get_kno_graph(large_known_net, gene_set)
+	names = np.array(sorted(gene_set), dtype = str) # node id of each gene is its index
+	inf_graph = get_inf_graph(inf_gene_pairs, registry, gene_set, args['edge_threshold'])
+	inf_src, inf_dst, _ = cg.edges(inf_graph)
+	inf_keys = get_edge_keys(inf_src, inf_dst, len(names))
+	kno_keys = get_kno_edge_keys(known_net, names)
+
+	# precision and recall of inferred edges against known edges at every threshold
+	if args['sweep_file']:
+		keys, strengths = get_inf_edge_strengths(inf_gene_pairs, registry, names)
+		threshes = np.linspace(0, strengths.max() if len(strengths) else 1, args['sweep_points'])
+		sweep, aupr = threshold_sweep(keys, strengths, drop_self_keys(kno_keys, len(names)), threshes)
+		with open(args['sweep_file'], 'w') as f:
+			write_sweep(f, threshes, sweep)
+		write_pr_curve(os.path.splitext(args['sweep_file'])[0] + '.png', sweep, aupr)
+		print 'area under precision recall curve is ' + str(aupr)
 
 	# print number of nodes and edges in inferred and known regulatory networks
-	print str(len(inf_graph.nodes())) + ' nodes in inferred graph'
-	print str(len(kno_graph.nodes())) + ' nodes in known graph'
-	print str(len(inf_graph.edges())) + ' edges in inferred graph'
-	print str(len(kno_graph.edges())) + ' edges in known graph'
+	print str(len(names)) + ' nodes in inferred graph'
+	print str(len(names)) + ' nodes in known graph'
+	print str(len(inf_keys)) + ' edges in inferred graph'
+	print str(len(kno_keys)) + ' edges in known graph'
 
 	# find edges exclusive to each graph and shared between graphs
-	inf_graph_only = nx.difference(inf_graph, kno_graph)
-	kno_graph_only = nx.difference(kno_graph, inf_graph)
-	shared_graph   = nx.difference(inf_graph, inf_graph_only)
+	shared_keys = np.intersect1d(inf_keys, kno_keys, assume_unique = True)
+	num_inf_only = len(inf_keys) - len(shared_keys)
+	num_kno_only = len(kno_keys) - len(shared_keys)
 
 	# print edges shared between graphs
-	print str(len(inf_graph_only.edges())) + ' of ' + str(len(inf_graph.edges())) + ' edges unique to inf_graph'
-	print str(len(kno_graph_only.edges())) + ' of ' + str(len(kno_graph.edges())) + ' edges unique to kno_graph'
-	print 'the ' + str(len(inf_graph.edges()) - len(inf_graph_only.edges())) + ' edge(s) in common are:'
-	print shared_graph.edges()
-	
+	print str(num_inf_only) + ' of ' + str(len(inf_keys)) + ' edges unique to inf_graph'
+	print str(num_kno_only) + ' of ' + str(len(kno_keys)) + ' edges unique to kno_graph'
+	print 'the ' + str(len(shared_keys)) + ' edge(s) in common are:'
+	print [ (names[key // len(names)], names[key % len(names)]) for key in shared_keys.tolist() ]
+
 	# plot ego graph for specific gene
-	write_ego_graph(shared_graph, EGO_GRAPH_GENE)
-
-#  input: known_net (np.array) [num_known_genes, 4]
-#         gene_set (set of string) gene names. to be used as nodes
-# output: G (nx.Graph) edges for each 
-def get_kno_graph(known_net, gene_set):
-	G = nx.Graph()
-	G.add_nodes_from(gene_set)
-	for geneA, _, geneB, _ in known_net:
-		if geneA in gene_set and geneB in gene_set:
-			G.add_edge(geneA, geneB)
-	return G.to_undirected()
-
-#  input: pairs (np.array) [num_pairs, 3] (string)
+	shared_graph = cg.build_graph(names, shared_keys // len(names), shared_keys % len(names))
+	write_ego_graph(shared_graph, EGO_GRAPH_GENE, args['output_directory'] + 'ego_' + EGO_GRAPH_GENE.replace('|', '_') + '.png')
+
+#  input: pairs (tuple) (genes, src, dst, weights) from pf.load_pairs
+#         registry (dict) from gr.new_registry of genes in pairs
+#         names (np.array) [num_nodes] (string) sorted gene names. edges between other genes are left out
+# output: keys (np.array) [num_edges] (int64) sorted keys of inferred edges. see get_edge_keys
+#         strengths (np.array) [num_edges] (float) largest absolute weight of each edge. edge is in
+#           get_inf_graph(pairs, registry, names, thresh) for every thresh <= its strength
+def get_inf_edge_strengths(pairs, registry, names):
+	genes, src, dst, weights = pairs
+	node_of = get_node_of(registry, names)
+	node_a, node_b = node_of[src], node_of[dst]
+	keep = np.flatnonzero((node_a >= 0) & (node_b >= 0) & (node_a != node_b))
+	node_a, node_b = node_a[keep].astype(np.int64), node_b[keep].astype(np.int64)
+	keys = np.minimum(node_a, node_b) * len(names) + np.maximum(node_a, node_b)
+	strengths = np.abs(weights[keep])
+	order = np.lexsort((strengths, keys))
+	keys, strengths = keys[order], strengths[order]
+	is_last = np.append(keys[1:] != keys[:-1], True) if len(keys) else np.zeros(0, dtype = bool) # strongest
+	return keys[is_last], strengths[is_last]
+
+#  input: keys (np.array) [num_edges] (int64) inferred edge keys from get_inf_edge_strengths
+#         strengths (np.array) [num_edges] (float) strength of each inferred edge
+#         kno_keys (np.array) [num_known_edges] (int64) sorted known edge keys from get_kno_edge_keys with self edges
+#           dropped (drop_self_keys). inferred edges are never self edges so those could never be found
+#         threshes (np.array) [num_threshes] (float) edge weight thresholds
+# output: sweep (dict) 'inferred', 'shared' (np.array) [num_threshes] (int) number of inferred edges and number
+#                        of those also known at each threshold
+#                      'precision', 'recall' (np.array) [num_threshes] (float) shared over inferred and shared
+#                        over known. precision is nan with no inferred edges
+#         aupr (float) area under precision recall curve over every distinct strength (average precision)
+#   does: sorts edges by strength once. counts at any threshold are a binary search into cumulative hit counts
+def threshold_sweep(keys, strengths, kno_keys, threshes):
+	order = np.argsort(strengths, kind = 'mergesort')
+	strengths = strengths[order]
+	is_hit = np.in1d(keys[order], kno_keys, assume_unique = True)
+	hits_above = np.append(np.cumsum(is_hit[::-1])[::-1], 0) # hits_above[i] known edges in strengths[i:]
+
+	first = np.searchsorted(strengths, threshes, side = 'left') # first edge with strength >= thresh
+	inferred = len(strengths) - first
+	shared = hits_above[first]
+	with np.errstate(invalid = 'ignore', divide = 'ignore'):
+		precision = shared / inferred.astype(float)
+		recall = shared / float(len(kno_keys)) if len(kno_keys) else np.zeros(len(threshes))
+
+	# exact curve. one point per distinct strength from strongest down
+	starts = np.flatnonzero(np.append(True, strengths[1:] != strengths[:-1])) if len(strengths) else np.zeros(0, dtype = int)
+	curve_inferred = (len(strengths) - starts)[::-1]
+	curve_shared = hits_above[starts][::-1]
+	aupr = 0.0
+	if len(kno_keys) and len(starts):
+		delta_recall = np.diff(np.append(0, curve_shared)) / float(len(kno_keys))
+		aupr = float(np.sum(delta_recall * curve_shared / curve_inferred.astype(float)))
+	return {'inferred': inferred, 'shared': shared, 'precision': precision, 'recall': recall}, aupr
+
+#  input: f (file) open file to write to
+#         threshes (np.array) [num_threshes] (float)
+#         sweep (dict) from threshold_sweep
+#   does: writes header then one tab separated line per threshold
+def write_sweep(f, threshes, sweep):
+	f.write(SWEEP_HEADER + '\n')
+	for row in zip(threshes.tolist(), sweep['inferred'].tolist(), sweep['shared'].tolist(),
+	               sweep['precision'].tolist(), sweep['recall'].tolist()):
+		f.write('\t'.join(map(str, row)) + '\n')
+
+#  input: known_net (dict) from ks.load_store
+#         names (np.array) [num_nodes] (string) sorted gene names. edges between other genes are left out
+# output: keys (np.array) [num_edges] (int64) sorted keys of known edges. see get_edge_keys
+def get_kno_edge_keys(known_net, names):
+	node_a, node_b = ks.get_edges_among(known_net, names)
+	return get_edge_keys(node_a, node_b, len(names))
+
+# returns keys (np.array) (int64) edge keys from get_edge_keys that are not self edges
+def drop_self_keys(keys, num_nodes):
+	return keys[keys // num_nodes != keys % num_nodes]
+
+#  input: node_a, node_b (np.array) [num_edges] (int) node ids of each undirected edge. may have duplicates
+#         num_nodes (int)
+# output: keys (np.array) [num_unique_edges] (int64) sorted unique min(a, b) * num_nodes + max(a, b) of each edge
+def get_edge_keys(node_a, node_b, num_nodes):
+	node_a, node_b = np.asarray(node_a, dtype = np.int64), np.asarray(node_b, dtype = np.int64)
+	return np.unique(np.minimum(node_a, node_b) * num_nodes + np.maximum(node_a, node_b))
+
+#  input: pairs (tuple) (genes, src, dst, weights) from pf.load_pairs
+#         registry (dict) from gr.new_registry of genes in pairs
 #         gene_set (set of string) gene names for genes to keep as nodes in graph
 #         edge_thresh (float) values where if absolute value of edge weight is below we do not include edge
-# output: G (nx.Graph) edges between each node pair in pairs if pairs p^2 value >= edge_threshold
-def get_inf_graph(pairs, gene_set, edge_thresh):
-	G = nx.Graph()
-	G.add_nodes_from(gene_set)
-	for geneA, geneB, edge_val in pairs:
-		geneA = geneA.split('|')[0]
-		geneB = geneB.split('|')[0]
-		try:
-			edge_val = float(edge_val)
-		except:
-			continue
-		if geneA == geneB or abs(edge_val) < edge_thresh:
-			continue
-		if geneA in gene_set and geneB in gene_set:
-			G.add_edge(geneA, geneB)
-	return G.to_undirected()
-
-#  input: pairs (np.array) [num_inferred_genes^2, 3] gene1, gene2, p^value. for all pairs
+# output: graph (dict) from cg.build_graph. nodes are sorted gene_set. edges between each node pair in pairs if
+#           pairs p^2 value >= edge_threshold
+def get_inf_graph(pairs, registry, gene_set, edge_thresh):
+	genes, src, dst, weights = pairs
+	names = np.array(sorted(gene_set), dtype = str)
+	node_of = get_node_of(registry, names) # node id of each gene in pairs. -1 if not in gene_set
+	keep = np.flatnonzero(np.abs(weights) >= edge_thresh)
+	node_a, node_b = node_of[src[keep]], node_of[dst[keep]]
+	keep = (node_a >= 0) & (node_b >= 0)
+	return cg.build_graph(names, node_a[keep], node_b[keep])
+
+#  input: registry (dict) from gr.new_registry of genes in pairs
+#         names (np.array) [num_nodes] (string) sorted gene symbols that are nodes
+# output: node_of (np.array) [num_genes] (int32) node id of symbol of each gene. -1 if symbol is not a node
+#   does: looks up each distinct symbol once then maps every gene by integer symbol id
+def get_node_of(registry, names):
+	node_of_symbol = gr.get_ids(gr.new_registry(names), registry['symbol_names'])
+	return node_of_symbol[registry['symbol_of']]
+
+#  input: pairs (tuple) (genes, src, dst, weights) from pf.load_pairs
+#         registry (dict) from gr.new_registry of genes in pairs
 # output: gene_set (set of string) names of genes in pairs
-def get_inf_gene_set(pairs):
-	gene_list = []
-	for gene1_name, gene2_name, _ in pairs:
-		gene_list.append(gene1_name.split('|')[0])
-		gene_list.append(gene2_name.split('|')[0])
-	return set(gene_list)
+def get_inf_gene_set(pairs, registry):
+	genes, src, dst, _ = pairs
+	used = np.union1d(np.unique(src), np.unique(dst))
+	return set(registry['symbol_names'][np.unique(registry['symbol_of'][used])].tolist())
 
 
 # # # # # # # # #
 #   P L O T S   #
 # # # # # # # # #
 
-# writes the ego graph of gene with gene_name to a file
-def write_ego_graph(graph, gene_name):
-	hub_ego = nx.ego_graph(graph, gene_name)
+# plots precision against recall of every threshold in sweep (dict) from threshold_sweep to fname
+def write_pr_curve(fname, sweep, aupr):
+	plt.plot(sweep['recall'], sweep['precision'], 'b')
+	plt.xlabel('recall')
+	plt.ylabel('precision')
+	plt.title('inferred edges against known network (AUPR ' + str(round(aupr, 4)) + ')')
+	plt.savefig(fname)
+	plt.clf()
+
+# writes the ego graph of gene with gene_name in graph (dict) from cg.build_graph to a file
+def write_ego_graph(graph, gene_name, fname):
+	node = gr.get_ids(gr.new_registry(graph['names']), [gene_name])[0]
+	hub_ego = cg.to_networkx(cg.ego_graph(graph, node))
 	pos = nx.spring_layout(hub_ego)
 	nx.draw(hub_ego, pos, alpha = 0.5, node_color='b', node_size=1000, with_labels = True)
 	nx.draw_networkx_nodes(hub_ego, pos, alpha = 0.5, nodelist = [gene_name], node_size = 1000, node_color='r', width = 5.0)
-	plt.savefig('ego_' + gene_name.replace('|', '_') + '.png')
+	plt.savefig(fname)
 	plt.clf()
 
 
@@ -125,10 +231,42 @@ def write_ego_graph(graph, gene_name):
 
 def get_args(argv):
 	parser = argparse.ArgumentParser(prog = 'barcode_and_q_values.py', description = "creates a tab separated value sheet with TCGA barcodes and q-value enrichment")
-	parser.add_argument('-r', '--reg_net_file', type = lambda x: is_valid_file(parser, x), required = True, help = 'file containing all pairs of genes from RNA sequence data with corresponding p^2 values')
+	parser.add_argument('-r', '--reg_net_file', type = lambda x: is_valid_pairs(parser, x), required = True, help = 'file (or its binary directory from pairs_format.py) containing all pairs of genes from RNA sequence data with corresponding p^2 values')
 	parser.add_argument('-k', '--known_network_file', type = lambda x: is_valid_file(parser, x), required = True, help = 'file containing edges between genes in known regulatory network')
+	parser.add_argument('-t', '--edge_threshold', type = float, default = EDGE_THRESH, help = 'absolute weight an inferred edge needs to be in the inferred graph')
+	parser.add_argument('-s', '--sweep_file', help = 'tab separated file to write inferred, shared, precision and recall at every threshold to. precision recall curve is plotted to a .png of the same name')
+	parser.add_argument('-o', '--output_directory', type = lambda x: valid_directory(parser, x), default = '.', help = 'directory for ego graph plot to go. defaults to current directory')
+	parser.add_argument('-n', '--sweep_points', type = lambda x: int_between(parser, x, 2, 100000), default = 101, help = 'number of evenly spaced thresholds from 0 to the largest absolute weight in sweep file')
 	return vars(parser.parse_args(argv))
 
+def int_between(parser, arg, low, high):
+	err_msg = 'should be integer between ' + str(low) + ' and ' + str(high)
+	try:
+		arg = int(arg)
+	except:
+		parser.error(err_msg)
+	if not (low <= arg and arg <= high):
+		parser.error(err_msg)
+	return arg
+
+# returns name so binary pairs directories are also accepted
+def is_valid_pairs(parser, arg):
+	if not os.path.exists(arg):
+		parser.error('The file \"' + str(arg) + '\" could not be found.')
+	return arg
+
+# returns string as directory. adds error to parser if no valid directory
+def valid_directory(parser, arg):
+	if not os.path.exists(arg):
+		parser.error('The directory \"' + str(arg) + '\" could not be found.')
+	return directorize(arg)
+
+# add "/" to end of directory name if necessary
+def directorize(dir_name):
+	if dir_name.endswith('/'):
+		return dir_name
+	return dir_name + '/'
+
 def is_valid_file(parser, arg):
 	if not os.path.exists(arg):
 		parser.error('The file \"' + str(arg) + '\" could not be found.')
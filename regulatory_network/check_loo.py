@@ -0,0 +1,103 @@
+#     file: check_loo.py
+#   author: Jesse Eaton and Jacob West-Roberts
+#  created: October 17, 2026
+# modified: October 17, 2026
+#  purpose: Checks that rank-one leave-one-out coexpression (regulatory_network.py --loo_mode rank_one) matches
+#             recomputing coexpression from the remaining samples (--loo_mode naive) for RNA sequence input
+
+
+# # # # # # # # # # #
+#   I M P O R T S   #
+# # # # # # # # # # #
+
+import sys         # for command line arguments
+import os          # for manipulating files and folders
+import argparse    # for command line arguments
+import numpy as np # for manipulating matricies
+
+# local modules
+sys.path.insert(0, '../helper/')
+import rna_cache as rc    # for loading RNA seq data from binary cache
+import panda_engine as pe # for naive and rank-one leave-one-out coexpression
+
+
+# # # # # # # # # # # # #
+#   C O N S T A N T S   #
+# # # # # # # # # # # # #
+
+DTYPES = {'float64': np.float64, 'float32': np.float32}
+MAX_DEVIATION = {'float64': 1e-10, 'float32': 1e-4} # default largest allowed absolute difference of correlations
+
+
+# # # # # # # # # # # # #
+#   F U N C T I O N S   #
+# # # # # # # # # # # # #
+
+def main(argv):
+	args = get_args(argv)
+	header, barcodes, expr = rc.load_rna_seq(args['input_file'])
+	expr = expr.T # view. rows are genes and cols are samples
+	dtype = DTYPES[args['dtype']]
+	max_deviation = args['max_deviation']
+	if max_deviation is None:
+		max_deviation = MAX_DEVIATION[args['dtype']]
+
+	num_samples = expr.shape[1]
+	samples = xrange(0, num_samples if args['num_samples'] is None else min(args['num_samples'], num_samples))
+	deviations = get_deviations(expr, samples, dtype)
+	worst = int(np.argmax(deviations))
+	print 'max deviation ' + repr(deviations[worst]) + ' at sample ' + barcodes[worst] + ' over ' + str(len(deviations)) + ' samples'
+	if deviations[worst] > max_deviation:
+		sys.exit('rank one leave one out coexpression differs from naive by more than ' + repr(max_deviation))
+
+#  input: expr (np.array) [num_genes, num_samples] (float)
+#         samples (iterable of int) samples to leave out one at a time
+#         dtype (np.dtype) float type of coexpression
+# output: deviations (np.array) [num_checked] (float) max absolute difference between naive and rank-one leave one
+#           out coexpression for each sample
+def get_deviations(expr, samples, dtype = np.float64):
+	num_samples = expr.shape[1]
+	mean, scatter_matrix = pe.get_scatter(expr, dtype)
+	deviations = []
+	for i in samples:
+		naive = pe.correlation(expr[:, np.delete(np.arange(num_samples), i)], dtype)
+		rank_one = pe.loo_correlation(mean, scatter_matrix, num_samples, expr[:, i], dtype)
+		deviations.append(np.abs(naive - rank_one).max())
+	return np.array(deviations)
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+#   C O M M A N D   L I N E   A R G U M E N T   F U N C T I O N S   #
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+def get_args(argv):
+	parser = argparse.ArgumentParser(prog = 'check_loo.py', description = "checks rank one leave one out coexpression of regulatory_network.py --loo_mode rank_one against recomputing it from the remaining samples. exits 1 if they differ by more than max deviation")
+	parser.add_argument('input_file', help = '.txt file containing all RNA sequence data. same as regulatory_network.py input', type = lambda x: is_valid_file(parser, x))
+	parser.add_argument('-d', '--dtype', choices = sorted(DTYPES.keys()), default = 'float64', help = 'float precision of coexpression')
+	parser.add_argument('-n', '--num_samples', type = lambda x: int_between(parser, x, 2, 1000000), help = 'only check the first this many samples. checks every sample by default')
+	parser.add_argument('-x', '--max_deviation', type = float, help = 'largest allowed absolute difference of any correlation. defaults to ' + ', '.join([ key + ' ' + repr(MAX_DEVIATION[key]) for key in sorted(MAX_DEVIATION) ]))
+	return vars(parser.parse_args(argv))
+
+def int_between(parser, arg, low, high):
+	err_msg = 'should be integer between ' + str(low) + ' and ' + str(high)
+	try:
+		arg = int(arg)
+	except:
+		parser.error(err_msg)
+	if not (low <= arg and arg <= high):
+		parser.error(err_msg)
+	return arg
+
+def is_valid_file(parser, arg):
+	if not os.path.exists(arg):
+		parser.error('The file \"' + str(arg) + '\" could not be found.')
+	else:
+		return open(arg, 'r')
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # #
+#   C A L L   T O   M A I N   F U N C T I O N   #
+# # # # # # # # # # # # # # # # # # # # # # # # #
+
+if __name__ == "__main__":
+	main(sys.argv[1:])
@@ -2,17 +2,27 @@
 #   author: Jesse Eaton and Jacob West-Roberts
 #  created: May 1, 2017
 # modified: May 1, 2017
-#  purpose: Iteratively calls regulatory_network.py on many directories
+#  purpose: Calls regulatory_network.py on many directories in a pool of worker processes
 
 
 # # # # # # # # # # #
 #   I M P O R T S   #
 # # # # # # # # # # #
 
-import sys        # for command line arguments
-import os         # for manipulating files and folders
-import argparse   # for command line arguments
-import subprocess # for calling other python scripts
+import sys             # for command line arguments
+import os              # for manipulating files and folders
+import argparse        # for command line arguments
+import multiprocessing # for running each regulatory network in its own process
+from multiprocessing.pool import ThreadPool # for running many regulatory networks at once
+import traceback       # for writing errors of failed jobs to their log
+import hashlib         # for keying jobs by input file contents and parameters
+import json            # for reading and writing manifest of finished jobs
+import shutil          # for removing temporary output directories
+
+# local modules
+import regulatory_network as rn # run in forked processes instead of a new python for every job
+sys.path.insert(0, '../helper/')
+import panda_engine as pe # for version of network inference
 
 
 # # # # # # # # # # # # #
@@ -21,11 +31,14 @@ import subprocess # for calling other python scripts
 
 IN_KAT_EXTS = ['.kat_pos.txt', '.kat_neg.txt']
 OUT_EXTS = ['.panda.pairs', '.lion.pairs']
+LOG_EXT = '.log' # each job writes its output and errors to a log next to its output files
+MANIFEST_FNAME = 'manifest.json' # in output directory. key of each finished job and its output files
+TEMP_PREFIX = '.tmp.' # jobs write to a temporary directory with this prefix then move outputs into place
+HASH_CHUNK = 1024 ** 2 # bytes of input file hashed at a time
 REG_NET_RUN_FILE = 'regulatory_network.py'
 GENE_TOP_NUM = 100
 
 
-
 # # # # # # # # # # # # #
 #   F U N C T I O N S   #
 # # # # # # # # # # # # #
@@ -34,30 +47,142 @@ def main(argv):
 	args = get_args(argv)
 
 	in_file_dict = get_file_dict(args['input_directory'], IN_KAT_EXTS)
-	out_file_dict = touch_output_directories_and_files(args['output_directory'], args['input_directory'], in_file_dict, OUT_EXTS)
+	out_file_dict = make_output_directories_and_files(args['output_directory'], args['input_directory'], in_file_dict, OUT_EXTS)
+	manifest_fname = args['output_directory'] + MANIFEST_FNAME
+	manifest = read_manifest(manifest_fname)
 
-	num_times_run = len(in_file_dict) * 2
-	print_now('Running ' + REG_NET_RUN_FILE + ' ' + str(num_times_run) + ' times:')
-	counter = 0
-	for subdir, in_files in in_file_dict.iteritems():
+	jobs, num_skipped = [], 0
+	for subdir, in_files in sorted(in_file_dict.iteritems()):
 		for kat_ext in ['.kat_pos', '.kat_neg']:
-			counter += 1
 			in_file = elements_with(in_files, kat_ext)[0]
 			out_files = elements_with(out_file_dict[subdir], kat_ext)
 			panda_file = elements_with(out_files, 'panda')[0]
 			lion_file = elements_with(out_files, 'lion')[0]
-			print_now('\n\t' + str(counter) + ' of ' + str(num_times_run) + ' - ' + in_file)
-			run_reg_net(args['input_directory'] + subdir + in_file, args['output_directory'] + subdir + panda_file, args['output_directory'] + subdir + lion_file, GENE_TOP_NUM)
+			log_file = os.path.splitext(in_file)[0] + LOG_EXT
+			job = {'id': subdir + in_file, 'in_file': args['input_directory'] + subdir + in_file,
+			       'out_dir': args['output_directory'] + subdir, 'panda_file': panda_file, 'lion_file': lion_file,
+			       'log_file': args['output_directory'] + subdir + log_file,
+			       'top_num': args['top_genes_plot'], 'retries': args['retries']}
+			job['key'] = get_job_key(job)
+			if not args['force'] and is_done(manifest, job):
+				num_skipped += 1
+				continue
+			jobs.append(job)
+
+	print_now('Skipping ' + str(num_skipped) + ' up to date runs. Running ' + REG_NET_RUN_FILE + ' ' + str(len(jobs)) + ' times with ' + str(args['num_processes']) + ' processes:')
+	failed = []
+	if jobs:
+		pool = ThreadPool(min(args['num_processes'], len(jobs))) # each thread waits on one job's processes
+		try:
+			for counter, (job, out_files, attempts) in enumerate(pool.imap_unordered(run_job, jobs), 1):
+				status = 'done' if out_files else 'FAILED after ' + str(attempts) + ' attempts'
+				print_now('\n\t' + str(counter) + ' of ' + str(len(jobs)) + ' - ' + job['in_file'] + ' ' + status)
+				if out_files:
+					manifest[job['id']] = {'key': job['key'], 'out_files': out_files}
+					write_manifest(manifest_fname, manifest) # after every job so a crash keeps finished jobs
+				else:
+					failed.append(job)
+		finally:
+			pool.terminate()
+			pool.join()
+	print_now('\n')
+
+	if failed:
+		eprint('\n' + str(len(failed)) + ' of ' + str(len(jobs)) + ' runs of ' + REG_NET_RUN_FILE + ' failed. see logs:')
+		for job in failed:
+			eprint('\t' + job['in_file'] + ' -> ' + job['log_file'])
+		exit(1)
+
+#  input: job (dict) 'in_file', 'log_file' (string) file names
+#                    'out_dir' (string) directory to move outputs to
+#                    'panda_file', 'lion_file' (string) output file names in out_dir
+#                    'top_num' (int) number of top genes to plot
+#                    'retries' (int) number of times to rerun job after it fails
+# output: job (dict) same as input
+#         out_files (list of string) names of output files moved to out_dir. empty if every attempt failed
+#         attempts (int) number of times regulatory_network.py was run
+#   does: runs each attempt of regulatory_network.py in its own forked process so a worker that dies (ex. killed
+#           for running out of memory) is a failed attempt instead of a hung pool. its output and any errors go
+#           to job's log file. outputs are written to a temporary directory and each renamed into out_dir only
+#           once the run has finished
+def run_job(job):
+	temp_dir = job['out_dir'] + TEMP_PREFIX + job['panda_file'] + '/'
+	open(job['log_file'], 'w').close()
+	with open(job['log_file'], 'a') as log: # append so lines written by attempt processes are kept
+		for attempt in xrange(1, job['retries'] + 2):
+			log.write('# attempt ' + str(attempt) + '\n')
+			log.flush()
+			if os.path.exists(temp_dir):
+				shutil.rmtree(temp_dir)
+			os.makedirs(temp_dir)
+			proc = multiprocessing.Process(target = run_attempt, args = (job, temp_dir))
+			proc.start()
+			proc.join()
+			if proc.exitcode != 0: # negative if killed by a signal
+				log.write('# attempt ' + str(attempt) + ' exited with code ' + str(proc.exitcode) + '\n')
+				log.flush()
+				continue
+			out_files = sorted(os.listdir(temp_dir))
+			for out_file in out_files:
+				os.rename(temp_dir + out_file, job['out_dir'] + out_file)
+			shutil.rmtree(temp_dir)
+			return job, out_files, attempt
+		shutil.rmtree(temp_dir)
+		return job, [], attempt
+
+#  input: job (dict) see run_job
+#         temp_dir (string) directory to write outputs to
+#   does: runs regulatory_network.py once with output and errors appended to job's log file. exits 1 on any error
+def run_attempt(job, temp_dir):
+	stdout, stderr = sys.stdout, sys.stderr
+	with open(job['log_file'], 'a') as log:
+		sys.stdout, sys.stderr = log, log
+		try:
+			run_reg_net(job['in_file'], temp_dir + job['panda_file'], temp_dir + job['lion_file'], job['top_num'])
+		except (Exception, SystemExit): # argparse errors exit
+			traceback.print_exc(file = log)
+			code = 1
+		else:
+			code = 0
+		finally:
+			sys.stdout, sys.stderr = stdout, stderr
+	sys.exit(code)
 
-# def run_reg_net(in_file, out_file):
 def run_reg_net(in_file, panda_file, lion_file, top_num):
-	cmd = ' '.join(['python', REG_NET_RUN_FILE, in_file, '-p', panda_file, '-l', lion_file, '-t', str(top_num)])
-	try:
-		subprocess.check_output(cmd, shell = True, stderr = subprocess.STDOUT) # run build_phylogeny command
-	except subprocess.CalledProcessError as e:
-		eprint('\nAn error in ' + REG_NET_RUN_FILE + ' occured:\n') # error if error occured while running script
-		eprint(e.output)
-		exit(e.returncode)
+	rn.main([in_file, '-p', panda_file, '-l', lion_file, '-t', str(top_num)])
+
+#  input: job (dict) see run_job
+# output: key (string) hash of contents of job's input file and every parameter that changes its output
+def get_job_key(job):
+	h = hashlib.sha1()
+	with open(job['in_file'], 'rb') as f:
+		for chunk in iter(lambda: f.read(HASH_CHUNK), ''):
+			h.update(chunk)
+	params = {'top_num': job['top_num'], 'panda_file': job['panda_file'], 'lion_file': job['lion_file'],
+	          'engine_version': pe.ENGINE_VERSION}
+	h.update(json.dumps(params, sort_keys = True))
+	return h.hexdigest()
+
+# returns True if manifest says job was finished with the same key and all its output files still exist
+def is_done(manifest, job):
+	entry = manifest.get(job['id'])
+	if entry is None or entry['key'] != job['key']:
+		return False
+	return all(os.path.exists(job['out_dir'] + out_file) for out_file in entry['out_files'])
+
+# returns manifest (dict) key is job id. val is dict with job 'key' and 'out_files'. empty if no manifest yet
+def read_manifest(fname):
+	if not os.path.exists(fname):
+		return {}
+	with open(fname, 'r') as f:
+		return json.load(f)
+
+# writes manifest to temporary file then renames it so a crash never leaves a half written manifest
+def write_manifest(fname, manifest):
+	temp_fname = fname + '.tmp'
+	with open(temp_fname, 'w') as f:
+		json.dump(manifest, f, indent = 1, sort_keys = True)
+	os.rename(temp_fname, fname)
 
 #  input: arr (list of string)
 #         substr (string) substring
@@ -86,28 +211,22 @@ def get_file_dict(in_dir, exts):
 #         in_dir (string) master directory for bulk input. ex: 'data/bulk/bulk_output/'
 #         in_file_dict (dict) keys are (string) subdirectory names
 #                             vals are (string) input file name in subdirectories
-#         out_exts (list of string) extensions of output files to touch in each output subdirectory. ex: ['.xml']
-#   does: creates all output subdirectories. touches all output files in subdirectories.
+#         out_exts (list of string) extensions of output files in each output subdirectory. ex: ['.xml']
+#   does: creates all output subdirectories. output files are only created once their job finishes
 # output: out_file_dict (dict) keys are (string) output subdirectory names
 #                              vals are (string) output file names in subdirectories
-def touch_output_directories_and_files(out_dir, in_dir, in_file_dict, out_exts):
+def make_output_directories_and_files(out_dir, in_dir, in_file_dict, out_exts):
 	out_file_dict = {}
 	for in_subdir, in_files in in_file_dict.iteritems():
 		out_file_dict[in_subdir] = []
+		if not os.path.exists(out_dir + in_subdir):
+			os.makedirs(out_dir + in_subdir)
 		for in_file in in_files:
 			for out_ext in out_exts:
 				out_file = os.path.splitext(in_file)[0] + out_ext
-				if not os.path.exists(out_dir + in_subdir):
-					os.makedirs(out_dir + in_subdir)
-				touch(out_dir + in_subdir + out_file)
 				out_file_dict[in_subdir].append(out_file)
 	return out_file_dict
 
-# creates file if file does not already exist
-def touch(fname, times = None):
-	with open(fname, 'a'):
-		os.utime(fname, times)
-
 # prints when called (not after script is finished running)
 def print_now(s):
 	sys.stdout.write(s)
@@ -129,9 +248,22 @@ def get_args(argv):
 	parser = argparse.ArgumentParser(prog = 'barcode_and_q_values.py', description = "creates a tab separated value sheet with TCGA barcodes and q-value enrichment")
 	parser.add_argument('-i', '--input_directory', type = lambda x: valid_master_directory(parser, x, IN_KAT_EXTS), help = 'directory containing subdirectories each with .kat_pos.txt and .kat_neg.txt files inside', required = True)
 	parser.add_argument('-o', '--output_directory', type = lambda x: valid_directory(parser, x), help = 'directory where output data will go', required = True)
-	parser.add_argument('-t', '--top_genes_plot', type = lambda x: int_between(parser, x, 1, 500), default = 100, help = 'number of top genes to plot a gene regulatory network for. will only plot PANDA gene regulatory network')
+	parser.add_argument('-t', '--top_genes_plot', type = lambda x: int_between(parser, x, 1, 500), default = GENE_TOP_NUM, help = 'number of top genes to plot a gene regulatory network for. will only plot PANDA gene regulatory network')
+	parser.add_argument('-j', '--num_processes', type = lambda x: int_between(parser, x, 1, 1024), default = multiprocessing.cpu_count(), help = 'number of regulatory networks to run at once. defaults to number of cores')
+	parser.add_argument('-f', '--force', action = 'store_true', help = 'rerun every regulatory network even if ' + MANIFEST_FNAME + ' in output directory says it is up to date')
+	parser.add_argument('-r', '--retries', type = lambda x: int_between(parser, x, 0, 100), default = 1, help = 'number of times to rerun a failed regulatory network before giving up on it')
 	return vars(parser.parse_args(argv))
 
+def int_between(parser, arg, low, high):
+	err_msg = 'should be integer between ' + str(low) + ' and ' + str(high)
+	try:
+		arg = int(arg)
+	except:
+		parser.error(err_msg)
+	if not (low <= arg and arg <= high):
+		parser.error(err_msg)
+	return arg
+
 # returns directory name with "/" suffix if directory has subdirectories with a single file from with extension from exts
 # errors otherwise
 def valid_master_directory(parser, arg, exts):
@@ -0,0 +1,81 @@
+#     file: merge_shards.py
+#   author: Jesse Eaton and Jacob West-Roberts
+#  created: October 17, 2026
+# modified: October 17, 2026
+#  purpose: Merge coexpression network shards from regulatory_network.py --shard into the same output a single
+#             regulatory_network.py run makes
+
+
+# # # # # # # # # # #
+#   I M P O R T S   #
+# # # # # # # # # # #
+
+import sys         # for command line arguments
+import os          # for manipulating files and folders
+import argparse    # for command line arguments
+
+# local modules
+sys.path.insert(0, '../helper/')
+import panda_engine as pe # for writing .panda.pairs output
+import corr_shards as cs  # for reading and merging shards
+
+
+# # # # # # # # # # # # #
+#   F U N C T I O N S   #
+# # # # # # # # # # # # #
+
+def main(argv):
+	args = get_args(argv)
+	shard_dirs = args['shard_dirs']
+	if not shard_dirs:
+		shard_dirs = find_shard_dirs(args['panda_output_file'])
+	try:
+		shards = cs.read_shards(shard_dirs)
+	except ValueError as e:
+		sys.exit('could not merge shards: ' + str(e))
+	genes = shards[0]['genes'].tolist()
+
+	with open(args['panda_output_file'], 'w') as f:
+		if shards[0]['meta']['threshold'] is None:
+			corr_fname = os.path.splitext(args['panda_output_file'])[0] + pe.CORR_EXT
+			corr = cs.merge_dense(shards, corr_fname)
+			pe.write_pairs(f, genes, genes, corr.T) # symmetric. transpose reads memory-mapped rows in order
+		else:
+			cs.merge_edges(f, shards)
+
+#  input: fname (string) PANDA output file shards were made for
+# output: shard_dirs (list of string) every shard directory of fname
+def find_shard_dirs(fname):
+	dirname = os.path.dirname(fname) or '.'
+	prefix = os.path.basename(fname) + '.shard_'
+	return [ os.path.join(dirname, name) for name in os.listdir(dirname)
+	         if name.startswith(prefix) and not name.endswith('.tmp') ]
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+#   C O M M A N D   L I N E   A R G U M E N T   F U N C T I O N S   #
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+def get_args(argv):
+	parser = argparse.ArgumentParser(prog = 'merge_shards.py', description = "merges coexpression network shards from regulatory_network.py --shard into one .panda.pairs file")
+	parser.add_argument('shard_dirs', nargs = '*', type = lambda x: is_valid_dir(parser, x), help = 'shard directories. defaults to every shard directory next to PANDA output file')
+	parser.add_argument('-p', '--panda_output_file', type = lambda x: has_extension(parser, x, '.panda.pairs'), required = True, help = 'name of file for merged PANDA output to go. should be the same -p the shards were made with')
+	return vars(parser.parse_args(argv))
+
+def has_extension(parser, arg, ext):
+	if not arg.endswith(ext):
+		parser.error('file should end with ' + ext + ' extension')
+	return arg
+
+def is_valid_dir(parser, arg):
+	if not os.path.isdir(arg):
+		parser.error('The directory \"' + str(arg) + '\" could not be found.')
+	return arg
+
+
+# # # # # # # # # # # # # # # # # # # # # # # # #
+#   C A L L   T O   M A I N   F U N C T I O N   #
+# # # # # # # # # # # # # # # # # # # # # # # # #
+
+if __name__ == "__main__":
+	main(sys.argv[1:])
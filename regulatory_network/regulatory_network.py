@@ -11,21 +11,28 @@
 
 import sys         # for command line arguments
 import os          # for manipulating files and folders
+import shutil      # for removing LIONESS store only kept to write LIONESS output
 import argparse    # for command line arguments
 import numpy as np # for manipulating matricies
-from pypanda import Panda          # for inferring a single gene regulatory network for all samples
-from pypanda import Lioness        # for inferring gene regulatory networks for each sample
 from pypanda import AnalyzePanda   # for plotting gene regulatory network from PANDA
 from pypanda import AnalyzeLioness # for plotting gene regulatory network from LIONESS
-import pandas as pd # haha I kind of don't know. maybe remove
+import pandas as pd # for handing PANDA results to AnalyzePanda
+
+# local modules
+sys.path.insert(0, '../helper/')
+import rna_cache as rc     # for loading RNA seq data from binary cache
+import panda_engine as pe  # for inferring gene regulatory networks (PANDA and LIONESS) in memory
+import lioness_store as ls # for saving LIONESS sample networks to a binary store and LIONESS output
+import corr_shards as cs   # for computing part of the coexpression network to merge later
 
 
 # # # # # # # # # # # # #
 #   C O N S T A N T S   #
 # # # # # # # # # # # # #
 
-TEMP_DIR = 'tmp/'
-TEMP_PANDA_INPUT = 'expression_data.txt'
+DTYPES = {'float64': np.float64, 'float32': np.float32}
+LIONESS_TEMP_EXT = '.tmp' + ls.STORE_EXT # without --lion_store sample networks are held in this store next to LIONESS
+                                         #   output until all are made
 
 
 # # # # # # # # # # # # #
@@ -34,47 +41,94 @@ TEMP_PANDA_INPUT = 'expression_data.txt'
 
 def main(argv):
 	args = get_args(argv)
-	rnas = np.genfromtxt(args['input_file'], dtype = str, delimiter = '\t')
-
-	# write input files for Panda
-	fname = write_panda_input(rnas, TEMP_DIR, TEMP_PANDA_INPUT)
+	header, barcodes, expr = rc.load_rna_seq(args['input_file'])
+	genes = header[1:].tolist()
+	expr = expr.T # view. rows are genes and cols are samples
+	dtype = DTYPES[args['dtype']]
+
+	# read prior networks. rows of PANDA network are transcription factors
+	motif, ppi, tfs = None, None, genes
+	if args['motif_file']:
+		motif, tfs = pe.read_prior(args['motif_file'], None, genes)
+	if args['ppi_file']:
+		ppi, _ = pe.read_prior(args['ppi_file'], tfs, tfs, symmetric = True)
+
+	# only some tiles of coexpression network. merged with other shards by merge_shards.py
+	if args['shard']:
+		shard, num_shards = args['shard']
+		dirname = cs.get_shard_dirname(args['panda_output_file'], shard, num_shards)
+		cs.write_shard(dirname, genes, expr, shard, num_shards, args['edge_threshold'], dtype, get_mem_budget(args))
+		return
+
+	# coexpression network in tiles so the full matrix is never in memory. only edges above threshold are kept
+	if args['edge_threshold'] is not None:
+		with open(args['panda_output_file'], 'w') as f:
+			pe.write_correlation_edges(f, genes, expr, args['edge_threshold'], dtype, get_mem_budget(args))
+		return
 
 	# run Panda (create gene regulatory network)
-	p = Panda(fname, None, None, remove_missing = False)
+	if args['memory_budget'] and motif is None:
+		corr_fname = os.path.splitext(args['panda_output_file'])[0] + pe.CORR_EXT
+		network = pe.correlation_memmap(expr, corr_fname, dtype, get_mem_budget(args))
+	else:
+		network = pe.panda(expr, motif, ppi, dtype, args['tolerance'])
 
 	# save Panda results
-	p.save_panda_results(file = args['panda_output_file'])
+	with open(args['panda_output_file'], 'w') as f:
+		if motif is None:
+			pe.write_pairs(f, tfs, genes, network.T) # symmetric. transpose reads memory-mapped rows in order
+		else:
+			pe.write_pairs(f, tfs, genes, network)
 
 	if args['top_genes_plot']:
 		num_genes = args['top_genes_plot']
-		plot = AnalyzePanda(p)
+		plot = AnalyzePanda(PandaResults(tfs, genes, network))
 		plot_fname = os.path.splitext(args['panda_output_file'])[0] + '.top_' + str(num_genes) + '_genes.png'
 		plot.top_network_plot(top = num_genes, file = plot_fname)
 
-	if args['lion_output_file']:
-
-		# run Lioness (infer many gene regulatory networks. one for each sample)
-		l = Lioness(p)
-
-		# save Lioness
-		l.save_lioness_results(file = args['lion_output_file'])
+	if args['lion_output_file'] or args['lion_store']:
+
+		# run Lioness (infer many gene regulatory networks. one for each sample) and save each as it is made
+		scatter = None
+		if args['loo_mode'] == 'rank_one':
+			scatter = pe.get_scatter(expr, dtype) # each sample's coexpression is a downdate of this
+		if args['num_processes'] > 1:
+			lioness_networks = pe.lioness_pool(expr, network, motif, ppi, dtype, args['tolerance'], args['num_processes'], scatter)
+		else:
+			lioness_networks = (pe.lioness(expr, i, network, motif, ppi, dtype, args['tolerance'], scatter) for i in xrange(0, expr.shape[1]))
+		# LIONESS output is edges by samples so each sample is written once to a store until every one is made
+		store_dirname = args['lion_store'] or args['lion_output_file'] + LIONESS_TEMP_EXT
+		store = ls.new_store(store_dirname, tfs, genes, barcodes, dtype)
+		try:
+			for lioness_network in lioness_networks:
+				ls.add_sample(store, lioness_network)
+		except:
+			ls.abort_store(store) # no half written store is left behind
+			raise
+		ls.close_store(store)
+		if args['lion_output_file']:
+			try:
+				with open(args['lion_output_file'], 'w') as f:
+					ls.write_pairs(f, ls.open_store(store_dirname))
+			finally:
+				if not args['lion_store']:
+					shutil.rmtree(store_dirname)
 
 	# plot = AnalyzeLioness(l)
 	# plot.top_network_plot(column= 0, top = 100, file = 'top_100_genes.png')
 
-def write_panda_input(rnas, temp_dir, fname):
-	rnas = np.transpose(np.delete(rnas, 0, 1))
-	if not os.path.exists(temp_dir):
-		os.makedirs(temp_dir)
-	temp_fname = temp_dir + fname
-	touch(temp_fname)
-	np.savetxt(open(temp_fname, 'w'), rnas, fmt = '%s', delimiter = '\t', newline = '\n')
-	return temp_fname
+# returns memory budget of tiled coexpression in bytes
+def get_mem_budget(args):
+	if args['memory_budget']:
+		return args['memory_budget'] * 1024 ** 2
+	return pe.MEM_BUDGET
 
-# creates file if file does not already exist
-def touch(fname, times = None):
-	with open(fname, 'a'):
-		os.utime(fname, times)
+# PANDA network in the form pypanda's AnalyzePanda reads. export_panda_results has tf, gene, force columns
+class PandaResults(object):
+	def __init__(self, tfs, genes, network):
+		self.export_panda_results = pd.DataFrame({'tf': np.tile(tfs, len(genes)),
+		                                          'gene': np.repeat(genes, len(tfs)),
+		                                          'force': network.flatten(order = 'F')})[['tf', 'gene', 'force']]
 
 
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
@@ -86,8 +140,33 @@ def get_args(argv):
 	parser.add_argument('input_file', help = '.txt file containing all RNA sequence data. should contain all values for each RNA for each sample in TCGA BRCA', type = lambda x: is_valid_file(parser, x))
 	parser.add_argument('-p', '--panda_output_file', type = lambda x: has_extension(parser, x, '.panda.pairs'), required = True, help = 'name of file for PANDA output to go. should have .panda.pairs extension')
 	parser.add_argument('-l', '--lion_output_file', type = lambda x: has_extension(parser, x, '.lion.pairs'), help = 'name of file for LIONESS output to go. should have .lion.pairs extension')
+	parser.add_argument('-L', '--lion_store', type = lambda x: has_extension(parser, x.rstrip('/'), ls.STORE_EXT), help = 'name of directory for LIONESS output to go as a binary store readable by sample or edge. should have ' + ls.STORE_EXT + ' extension')
 	parser.add_argument('-t', '--top_genes_plot', type = lambda x: int_between(parser, x, 1, 500), help = 'number of top genes to plot a gene regulatory network for. will only plot PANDA gene regulatory network')
-	return vars(parser.parse_args(argv))
+	parser.add_argument('-m', '--motif_file', type = lambda x: is_valid_file(parser, x), help = 'tab separated TF, gene, weight prior network. without it the network is gene coexpression')
+	parser.add_argument('-i', '--ppi_file', type = lambda x: is_valid_file(parser, x), help = 'tab separated TF, TF, weight protein interaction prior network. only used with motif file')
+	parser.add_argument('-d', '--dtype', choices = sorted(DTYPES.keys()), default = 'float64', help = 'float precision of all networks. float32 halves memory')
+	parser.add_argument('-j', '--num_processes', type = lambda x: int_between(parser, x, 1, 1024), default = 1, help = 'number of processes to infer LIONESS sample networks with')
+	parser.add_argument('--loo_mode', choices = ['naive', 'rank_one'], default = 'naive', help = 'how LIONESS finds coexpression of all samples but one. naive recomputes it from the remaining samples. rank_one downdates the coexpression of all samples, which is much faster for many samples')
+	parser.add_argument('--tolerance', type = float, default = pe.TOLERANCE, help = 'PANDA message passing stops once mean absolute change of network is below this')
+	parser.add_argument('-b', '--memory_budget', type = lambda x: int_between(parser, x, 1, 1024 ** 3), help = 'megabytes of memory for computing the coexpression network in tiles. without motif file the network is written to a memory-mapped ' + pe.CORR_EXT + ' file next to PANDA output instead of being held in memory')
+	parser.add_argument('-e', '--edge_threshold', type = float, help = 'only write coexpression edges with absolute correlation at least this to PANDA output. each pair of genes is written once. full network is never held in memory')
+	parser.add_argument('--shard', type = lambda x: shard_arg(parser, x), help = 'i/N to compute only shard i (0 to N-1) of N of the coexpression network into a directory next to PANDA output. merge all N with merge_shards.py. use the same -b, -d and -e for every shard')
+	args = vars(parser.parse_args(argv))
+	for opt, name in [('edge_threshold', '-e'), ('shard', '--shard')]:
+		if args[opt] is not None and (args['motif_file'] or args['lion_output_file'] or args['lion_store'] or args['top_genes_plot']):
+			parser.error(name + ' only writes the coexpression network. can not be used with -m, -l, -L or -t')
+	return args
+
+# returns (shard, num_shards) (int, int) from string 'shard/num_shards'
+def shard_arg(parser, arg):
+	err_msg = 'shard should be i/N with 0 <= i < N'
+	try:
+		shard, num_shards = map(int, arg.split('/'))
+	except:
+		parser.error(err_msg)
+	if not (0 <= shard and shard < num_shards):
+		parser.error(err_msg)
+	return shard, num_shards
 
 def int_between(parser, arg, low, high):
 	err_msg = 'should be integer between ' + str(low) + ' and ' + str(high)
@@ -17,13 +17,14 @@ import numpy as np # for manipulating matricies
 # local modules
 sys.path.insert(0, '../helper/')
 import kataegis_splitter as ks # for splitting RNA seq data to kataegis pos and neg samples
+import rna_cache as rc         # for loading RNA seq data from binary cache
 
 
 # # # # # # # # # # # # #
 #   C O N S T A N T S   #
 # # # # # # # # # # # # #
 
-# here
+WRITE_BUFFER_SIZE = 1 << 20 # bytes buffered per output file in streaming mode
 
 
 # # # # # # # # # # # # #
@@ -34,27 +35,74 @@ def main(argv):
 	args = get_args(argv)
 	
 	kats = np.genfromtxt(args['kataegis_file'], dtype = str, delimiter = '\t')
-	rnas = np.genfromtxt(args['rna_seq_file'], dtype = str, delimiter = '\t')
 
-	# keep all samples with TCGA barcodes in both
-	kats, rnas = ks.keep_same_barcode(kats, rnas)
-
-	rnas_pos, rnas_neg = ks.kat_split(rnas, kats, args['q_value_cutoff'])
-
-	# insert file header (with gene names)
-	rnas_pos = np.insert(rnas_pos, 0, rnas[0], 0)
-	rnas_neg = np.insert(rnas_neg, 0, rnas[0], 0)
+	cutoffs = sorted(set(args['q_value_cutoff']))
 
 	# get file name with no directory to file and no .txt extension
 	fname_prefix = os.path.splitext(os.path.basename(args['rna_seq_file'].name))[0]
-	fname_pos = args['output_directory'] + fname_prefix + '.kat_pos.txt'
-	fname_neg = args['output_directory'] + fname_prefix + '.kat_neg.txt'
-
-	touch(fname_pos)
-	touch(fname_neg)
-
-	np.savetxt(open(fname_pos, 'w'), rnas_pos, fmt = '%s', delimiter = '\t', newline = '\n')
-	np.savetxt(open(fname_neg, 'w'), rnas_neg, fmt = '%s', delimiter = '\t', newline = '\n')
+	fnames = get_output_fnames(args['output_directory'], fname_prefix, cutoffs)
+
+	for fname_pos, fname_neg in fnames:
+		touch(fname_pos)
+		touch(fname_neg)
+
+	if args['stream']:
+		stream_split(args['rna_seq_file'], kats, cutoffs, fnames)
+		return
+
+	header, barcodes, _ = rc.load_rna_seq(args['rna_seq_file'])
+	text = rc.load_rna_text(args['rna_seq_file'])
+
+	# rows of samples with TCGA barcodes in both. for each cutoff
+	splits = ks.multi_split_rows(barcodes, kats, cutoffs)
+
+	for (pos_rows, neg_rows), (fname_pos, fname_neg) in zip(splits, fnames):
+		with open(fname_pos, 'w') as f_pos:
+			rc.write_rna_seq(f_pos, header, barcodes, text, pos_rows)
+		with open(fname_neg, 'w') as f_neg:
+			rc.write_rna_seq(f_neg, header, barcodes, text, neg_rows)
+
+#  input: out_dir (string) output directory
+#         fname_prefix (string) RNA sequence file name with no directory and no extension
+#         cutoffs (list of float) sorted q-value enrichment cutoffs
+# output: fnames (list of tuple) [num_cutoffs] (kat_pos_file, kat_neg_file) for each cutoff. a single cutoff
+#           writes directly to out_dir. many cutoffs each get a subdirectory. ex: out_dir/q_0.05/
+def get_output_fnames(out_dir, fname_prefix, cutoffs):
+	fnames = []
+	for cutoff in cutoffs:
+		cutoff_dir = out_dir
+		if len(cutoffs) > 1:
+			cutoff_dir = out_dir + 'q_' + str(cutoff) + '/'
+			if not os.path.exists(cutoff_dir):
+				os.makedirs(cutoff_dir)
+		fnames.append((cutoff_dir + fname_prefix + '.kat_pos.txt', cutoff_dir + fname_prefix + '.kat_neg.txt'))
+	return fnames
+
+#  input: f (file) RNA sequence data. first row is header with gene names. first col is TCGA barcodes
+#         kats (np.array) [num_kat_samples, 2] has TCGA barcodes and q-value
+#         cutoffs (list of float) sorted q-value enrichment cutoffs to separate kataegis pos from neg
+#         fnames (list of tuple) [num_cutoffs] (kat_pos_file, kat_neg_file) for each cutoff
+#   does: copies each line of f to kataegis pos or neg file of every cutoff as it is read so memory use does
+#           not depend on number of samples. samples keep the order of f and values are not reformatted
+def stream_split(f, kats, cutoffs, fnames):
+	rank = ks.get_cutoff_rank_dic(kats, cutoffs) # key: barcode, val: sample is kat pos for cutoffs[rank:]
+	f.seek(0)
+	f_poss = [ open(fname_pos, 'w', WRITE_BUFFER_SIZE) for fname_pos, _ in fnames ]
+	f_negs = [ open(fname_neg, 'w', WRITE_BUFFER_SIZE) for _, fname_neg in fnames ]
+	header = f.readline()
+	for f_out in f_poss + f_negs:
+		f_out.write(header)
+	for line in f:
+		barcode = line[:line.find('\t')]
+		if barcode not in rank:
+			continue
+		r = rank[barcode]
+		for f_neg in f_negs[:r]:
+			f_neg.write(line)
+		for f_pos in f_poss[r:]:
+			f_pos.write(line)
+	for f_out in f_poss + f_negs:
+		f_out.close()
 
 # creates file if file does not already exist
 def touch(fname, times = None):
@@ -71,9 +119,20 @@ def get_args(argv):
 	parser.add_argument('-r', '--rna_seq_file', type = lambda x: is_valid_file(parser, x), required = True, help = 'file containing all RNA sequence data. should contain all values for each RNA for each sample in TCGA BRCA')
 	parser.add_argument('-k', '--kataegis_file', type = lambda x: is_valid_file(parser, x), required = True, help = 'file containing q-value enrichment for each sample')
 	parser.add_argument('-o', '--output_directory', type = lambda x: valid_directory(parser, x), required = True, help = 'directory for two output RNA sequence files to go')
-	parser.add_argument('-q', '--q_value_cutoff', type = lambda x: bounded_float(parser, x, 0.0, 1.0), default = 0.05, help = 'float between 0.0 and 1.0. any samples with q value <= cutoff are kataegis positive. q value > cutoff are kataegis negative')
+	parser.add_argument('-q', '--q_value_cutoff', type = lambda x: bounded_float(parser, x, 0.0, 1.0), nargs = '+', default = [0.05], help = 'one or more floats between 0.0 and 1.0. any samples with q value <= cutoff are kataegis positive. q value > cutoff are kataegis negative. many cutoffs are all split in one read of the input and each written to a q_<cutoff> subdirectory')
+	parser.add_argument('-s', '--stream', action = 'store_true', help = 'copy RNA sequence file line by line to output files instead of loading it from binary cache. memory use does not grow with number of samples')
 	return vars(parser.parse_args(argv))
 
+def bounded_float(parser, arg, low, high):
+	err_msg = 'q value cutoff must be float between ' + str(low) + ' and ' + str(high)
+	try:
+		arg = float(arg)
+	except:
+		parser.error(err_msg)
+	if not (arg > low and arg < high):
+		parser.error(err_msg)
+	return arg
+
 def is_valid_file(parser, arg):
 	if not os.path.exists(arg):
 		parser.error('The file \"' + str(arg) + '\" could not be found.')